@@ -0,0 +1,61 @@
+"""
+    compares the ways of checking prerequisites over the whole catalog:
+    the old set/issubset check against prereqlist, the and/or expression and
+    the bitmask version (prereq.PrereqBits).
+    run from the repository root:  python benchmarks/bench_prereq.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import prereq
+import prerequisite_checker as pc
+
+ROUNDS = 2000       # random completed sets to check every unit against
+
+
+def set_check(prereqlist, covered) -> bool:
+    """the check get_study_plan_s1 used to do"""
+    if len(prereqlist) == 0:
+        return True
+    return any(set(prereqs).issubset(covered) for prereqs in prereqlist)
+
+
+def timed(label, fn, checks):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:12}: {elapsed * 1000:8.2f} ms  {elapsed / checks * 1e9:8.1f} ns/check")
+    return result
+
+
+def main(rounds=ROUNDS):
+    units = {name: unit for name, unit in pc.STORE.load_units().items() if hasattr(unit, "prereq")}
+    lists = {name: unit.prereqlist for name, unit in units.items()}
+    exprs = {name: unit.get_prereq_expr() for name, unit in units.items()}
+    bits = prereq.PrereqBits(units)
+
+    everything = sorted(bits.table.codes)
+    rng = random.Random(0)
+    sets = [set(rng.sample(everything, rng.randint(0, len(everything)))) for _ in range(rounds)]
+    masks = [bits.completed(covered) for covered in sets]
+    checks = rounds * len(units)
+    print(f"{len(units)} units x {rounds} completed sets = {checks} checks")
+
+    lists = list(lists.values())
+    exprs = list(exprs.values())
+    compiled = [bits.prereqs[name].check for name in units]
+    evaluate = prereq.evaluate
+
+    a = timed("sets", lambda: [[set_check(p, s) for p in lists] for s in sets], checks)
+    b = timed("expression", lambda: [[evaluate(e, s) for e in exprs] for s in sets], checks)
+    c = timed("bitmask", lambda: [[check(m) for check in compiled] for m in masks], checks)
+    print("results agree:", a == b == c)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+    offline benchmarks for the main stages of the program:
+        parse       handbook html -> Unit for every recorded page
+        pickles     loading the old unit and course pickles in units/ and courses/
+        load        loading the whole catalog through UnitList (get_unit_list_helper)
+        prereq      parsing every prerequisite text, expanding it to the old
+                    prereqlist and checking it against random completed sets
+        plan        a study plan for every course, semester 1 and 2 intake
+        startup     a new python process running plan.py for one course (cold
+                    start from the catalog snapshot), which fails if it imports
+                    requests or bs4
+    nothing is fetched, handbook.OFFLINE is set for the whole run.
+
+    every run is added to history.json next to this file and compared with the
+    median of the last few runs, the script exits with 1 if any stage got slower
+    by more than the threshold.
+
+    run from the repository root:
+        python benchmarks/bench_suite.py                   # run, record and compare
+        python benchmarks/bench_suite.py --threshold 0.1 --repeat 7
+        python benchmarks/bench_suite.py --no-save         # compare without recording
+        python benchmarks/bench_suite.py record            # fetch the pages again
+
+    the parse stage runs on the recorded unit pages in pages/ (RECORDED), which
+    are checked in so every machine parses the same pages. "record" fetches them
+    from the handbook again (or takes them from the handbook cache), a page that
+    can't be had is left as it is.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+import catalog
+import handbook
+import prereq
+import prerequisite_checker as pc
+import scheduler
+
+HERE = pathlib.Path(__file__).resolve().parent
+PAGES = HERE / "pages"
+RECORDED = ("CITS1401", "CITS2200", "CITS3002", "CITS4010", "CITS4404",
+            "GENG3000", "MATH1721", "PHIL1001", "STAT3405")
+HISTORY = HERE / "history.json"
+THRESHOLD = 0.25    # fail if a stage is this much slower than the baseline
+REPEAT = 5          # runs of each stage, the fastest is kept
+BASELINE = 5        # number of previous runs the baseline is the median of
+NOISE = 0.002       # seconds, smaller differences never count as a regression
+ROUNDS = 200        # random completed sets in the prereq stage
+
+
+def record(names=RECORDED) -> int:
+    """fetches the handbook page of every unit in names into PAGES, returns how many"""
+    PAGES.mkdir(exist_ok=True)
+    count = 0
+    for name in names:
+        try:
+            page = handbook.fetch(pc.Unit.URL + name)
+        except Exception as e:
+            print(f"couldn't fetch {name}: {e}")
+            continue
+        if page.status_code != 200:
+            print(f"couldn't fetch {name}: {page.status_code}")
+            continue
+        (PAGES / (name + ".html")).write_text(page.text, encoding="utf-8")
+        count += 1
+    return count
+
+
+def pages() -> dict:
+    return {f.stem: f.read_text(encoding="utf-8") for f in sorted(PAGES.glob("*.html"))}
+
+
+def bench_parse(pages):
+    def run():
+        for name, html in pages.items():
+            pc.Unit(name, pc.page_lines(html), False)
+    return run
+
+
+def bench_pickles():
+    def run():
+        for path in (pc.UNIT_PATH, pc.COURSE_PATH):
+            for f in sorted(pathlib.Path(path).iterdir()):
+                if f.is_file() and not f.name.startswith("."):
+                    catalog.load_pickle(f)
+    return run
+
+
+def bench_load(names):
+    def run():
+        pc.STORE.stamp = None       # make it read the index again too
+        pc.UnitList(ulist=names)
+    return run
+
+
+def bench_prereq(units):
+    texts = [unit.prereq for unit in units.values() if hasattr(unit, "prereq")]
+
+    def run():
+        rng = random.Random(0)
+        exprs = [prereq.from_text(text) for text in texts]
+        [prereq.to_dnf(expr) for expr in exprs]
+        bits = prereq.PrereqBits(units)
+        codes = sorted(bits.table.codes)
+        for _ in range(ROUNDS):
+            bits.unlocked(bits.completed(rng.sample(codes, rng.randint(0, len(codes)))))
+    return run
+
+
+def bench_plan(courses):
+    def run():
+        for course in courses:
+            for intake in (1, 2):
+                try:
+                    scheduler.schedule(course, intake)
+                except scheduler.PlanError:
+                    pass
+    return run
+
+
+def bench_startup(course):
+    code = (f"import sys, plan; plan.main([{course!r}]); "
+            f"sys.exit(any(module in sys.modules for module in ('requests', 'bs4')))")
+    catalog.open_snapshot(pc.STORE)     # made here so it isn't timed
+
+    def run():
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"plan.py failed or loaded requests/bs4:\n{result.stdout}{result.stderr}")
+    return run
+
+
+def timed(fn, repeat) -> float:
+    """fastest of repeat runs, in seconds. what the stage prints is thrown away"""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=ROOT).stdout.strip()
+    except OSError:
+        return ""
+
+
+def load_history() -> list:
+    try:
+        with open(HISTORY) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def compare(results, history, threshold) -> list:
+    """the stages slower than the baseline by more than threshold, as (stage, now, baseline)"""
+    slower = []
+    for stage, seconds in results.items():
+        past = [run["results"][stage] for run in history[-BASELINE:] if stage in run["results"]]
+        if len(past) == 0:
+            continue
+        baseline = statistics.median(past)
+        if seconds > baseline * (1 + threshold) and seconds - baseline > NOISE:
+            slower.append((stage, seconds, baseline))
+    return slower
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="offline benchmarks")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "record"])
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="allowed slow down before a stage fails (0.25 is 25%%)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--no-save", action="store_true", help="don't add this run to the history")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        print(f"recorded {record()} pages in {PAGES}")
+        return 0
+
+    handbook.OFFLINE = True
+    with contextlib.redirect_stdout(io.StringIO()):
+        units = pc.STORE.load_units(text=True)
+
+    courses = [pc.STORE.get_course(name) for name in pc.STORE.course_names()]
+    for course in courses:
+        course.load_plan_units()
+    stages = {"parse": bench_parse(pages()),
+              "pickles": bench_pickles(),
+              "load": bench_load(pc.STORE.unit_names()),
+              "prereq": bench_prereq(units),
+              "plan": bench_plan(courses),
+              "startup": bench_startup(pc.STORE.course_names()[0])}
+
+    results = {}
+    for stage, fn in stages.items():
+        results[stage] = timed(fn, args.repeat)
+        print(f"{stage:8}: {results[stage] * 1000:9.2f} ms")
+
+    history = load_history()
+    slower = compare(results, history, args.threshold)
+    if not args.no_save:
+        history.append({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit(),
+                        "python": platform.python_version(), "results": results})
+        with open(HISTORY, "w") as f:
+            json.dump(history, f, indent=1)
+    for stage, seconds, baseline in slower:
+        print(f"REGRESSION {stage}: {seconds * 1000:.2f} ms vs {baseline * 1000:.2f} ms baseline")
+    return 1 if len(slower) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
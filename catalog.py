@@ -0,0 +1,558 @@
+"""
+    single file catalog store for units and courses.
+    replaces one pickle per unit in units/ (and per course in courses/) with one
+    file that has an index by name, unit code and handbook year, so one unit can
+    be read with a seek and the whole catalog with one sequential read.
+
+    the file is laid out as
+        MAGIC | index offset (8 bytes) | record | record | ... | index
+    records only hold plain python values (tuples, strings, ...), so nothing in
+    the file refers to a module path (the old pickles only load as __main__).
+    a course record is its pickled attribute dict with the unit names in place
+    of the unit list. a unit record (UNIT_FORMAT 2) is
+        (2, UNIT_FIELDS values, UNIT_DETAILS values, text hash, other attributes)
+    the page text a unit was parsed from is kept apart (zlib compressed) and only
+    read when asked for, load_units(text=True) or get_text(). version 1 unit
+    records (the attribute dict, page text and all) are still read, upgrade
+    rewrites them.
+    writes go to a temp file which replaces the old one, so a batch either lands
+    completely or not at all.
+
+    migrate the old pickles with
+        python catalog.py migrate [units dir] [courses dir] [catalog file]
+    and rewrite old unit records in the current format with
+        python catalog.py upgrade [catalog file]
+
+    a snapshot is a catalog file with only what planning needs (the UNIT_FIELDS
+    of every unit, the courses without their page text), a fraction of the size,
+    for quick starts (see plan.py). every batch written to a catalog counts up its
+    generation (kept in the index), a snapshot remembers the generation it was made
+    from and open_snapshot makes it again when the catalog's is different.
+        python catalog.py snapshot [catalog file] [snapshot file]
+"""
+
+import hashlib
+import os
+import pathlib
+import pickle
+import struct
+import sys
+import zlib
+from contextlib import contextmanager
+
+import instrument
+
+CATALOG_PATH = "./catalog.db"
+SNAPSHOT_PATH = "./catalog.snapshot"
+HANDBOOK_YEAR = "2023"      # year of units that don't say otherwise
+MAGIC = b"UWACAT1\n"
+HEADER = struct.Struct(">Q")
+UNIT_FORMAT = 2     # unit records written now, 1 was the whole attribute dict
+# what planning needs, in a small fixed record
+UNIT_FIELDS = ("code", "title", "credit", "semester", "offer", "prereq_expr", "incompatibility")
+# the rest of what's parsed from the page
+UNIT_DETAILS = ("description", "outcomes", "coordinator", "ugdetails", "prereq", "offering")
+KEEP_TEXT = True    # save the page text of units (only needed to parse them again)
+COMPACT = 2         # rewrite the catalog once it's this many times the size of what's in use
+
+# the Unit, UnitList and Course classes, filled in by prerequisite_checker.
+# done this way so it works whether that module is imported or run as __main__.
+CLASSES = {}
+
+
+def register(**classes) -> None:
+    """register the classes records are turned back into"""
+    CLASSES.update(classes)
+
+
+def unit_key(name, unit) -> tuple:
+    """ returns (code, year) for a unit saved under name.
+        names like "CITS2200 2024" carry the year, otherwise it comes from the page
+        title line ("UWA Handbook 2023") or defaults to HANDBOOK_YEAR.
+        the code is the first word of the name, so a hand made copy like "CITS1003b"
+        is its own code and isn't found in place of CITS1003.
+    """
+    parts = name.split()
+    if len(parts) > 1 and parts[1].isnumeric():
+        return parts[0], parts[1]
+    for line in getattr(unit, "text", [])[:5]:
+        if line.startswith("UWA Handbook "):
+            return parts[0], line.split()[-1]
+    return parts[0], HANDBOOK_YEAR
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    """loads the old per-file pickles, which point at __main__.Unit etc."""
+    def find_class(self, module, name):
+        if module == "__main__" and name in CLASSES:
+            return CLASSES[name]
+        return super().find_class(module, name)
+
+
+def load_pickle(path):
+    """load one of the old unit or course pickle files"""
+    with open(path, "rb") as f:
+        return LegacyUnpickler(f).load()
+
+
+def make(cls, state):
+    """makes an object of cls from its attribute dict without calling __init__"""
+    obj = cls.__new__(cls)
+    if hasattr(cls, "__setstate__"):
+        obj.__setstate__(state)
+    else:
+        obj.__dict__.update(state)
+    return obj
+
+
+def state_of(obj) -> dict:
+    """the attribute dict of obj, slotted classes (Unit, Course) included"""
+    return obj.__getstate__() if hasattr(type(obj), "__slots__") else dict(vars(obj))
+
+
+def text_hash(text) -> str:
+    """hash of the page lines a unit was parsed from"""
+    return hashlib.sha1("\n".join(text).encode()).hexdigest()
+
+
+def encode_unit(unit, details=True) -> bytes:
+    """the UNIT_FORMAT record for a unit, without its page text (or UNIT_DETAILS if details is False)"""
+    state = state_of(unit)
+    values = dict(state)
+    if hasattr(unit, "get_prereq_expr"):
+        values["prereq_expr"] = unit.get_prereq_expr()
+    if isinstance(values.get("semester"), (set, frozenset)):
+        values["semester"] = tuple(sorted(values["semester"]))
+    if isinstance(values.get("offer"), list):
+        values["offer"] = tuple(tuple(row) for row in values["offer"])
+    # Unit.__setstate__ turns semester and offer back into shared frozensets and tuples
+    fields = tuple(values.get(name) for name in UNIT_FIELDS)
+    details = tuple(values.get(name) if details else None for name in UNIT_DETAILS)
+    digest = text_hash(state["text"]) if "text" in state else state.get("text_hash")
+    known = UNIT_FIELDS + UNIT_DETAILS + ("text", "text_hash", "prereqlist")
+    extra = {name: value for name, value in state.items() if name not in known}
+    return pickle.dumps((UNIT_FORMAT, fields, details, digest, extra), pickle.HIGHEST_PROTOCOL)
+
+
+def decode_unit(record, text=None):
+    """makes a Unit from a unit record (any format) and, if given, its page text"""
+    record = pickle.loads(record)
+    if isinstance(record, dict):
+        state = record
+    elif record[0] == 2:
+        _, fields, details, digest, extra = record
+        state = dict(extra)
+        for name, value in zip(UNIT_FIELDS + UNIT_DETAILS, fields + details):
+            if value is not None or name == "prereq_expr":
+                state[name] = value
+        if digest is not None:
+            state["text_hash"] = digest
+    else:
+        raise ValueError(f"unit record format {record[0]} is newer than this program knows")
+    if text is not None:
+        state["text"] = text
+    return make(CLASSES["Unit"], state)
+
+
+def encode_text(text) -> bytes:
+    return zlib.compress("\n".join(text).encode())
+
+
+def decode_text(data) -> list:
+    text = zlib.decompress(data).decode()
+    return text.split("\n") if len(text) > 0 else []
+
+
+class CatalogStore:
+    """ the catalog file.
+        index["units"] maps name -> (code, year, offset, length)
+        index["courses"] maps name -> (offset, length)
+        index["texts"] maps unit name -> (offset, length) of its page text
+        index["generation"] counts the batches written to the file
+        index["source"] is the generation of the catalog a snapshot was made from
+        stamp is (mtime, size) of the file when the index was read, refresh reads
+        it again when that changes
+    """
+    def __init__(self, path=CATALOG_PATH) -> None:
+        self.path = pathlib.Path(path)
+        self.index = {"units": {}, "courses": {}, "texts": {}, "source": None, "generation": 0}
+        self.by_code = {}
+        self.stamp = None
+
+    def refresh(self) -> None:
+        """re-read the index if the file changed since we last looked"""
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            self.index, self.by_code, self.stamp = {"units": {}, "courses": {}, "texts": {}, "source": None, "generation": 0}, {}, None
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self.stamp:
+            return
+        with open(self.path, "rb") as f:
+            offset = self.read_header(f.read(len(MAGIC) + HEADER.size))
+            f.seek(offset)
+            self.set_index(pickle.load(f))
+        self.stamp = stamp
+
+    def read_header(self, data) -> int:
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a catalog file")
+        return HEADER.unpack_from(data, len(MAGIC))[0]
+
+    def set_index(self, index) -> None:
+        index.setdefault("texts", {})
+        index.setdefault("source", None)
+        index.setdefault("generation", 0)     # saved before there were generations
+        self.index = index
+        self.by_code = {}
+        units = index["units"]
+        for name, (code, year, offset, length) in list(units.items()):
+            if code != name.split()[0]:     # saved before unit_key used the whole first word
+                code = name.split()[0]
+                units[name] = (code, year, offset, length)
+            self.by_code.setdefault(code, {})[year] = name
+
+    def __contains__(self, name):
+        self.refresh()
+        return name in self.index["units"]
+
+    def unit_names(self) -> list:
+        self.refresh()
+        return sorted(self.index["units"])
+
+    def course_names(self) -> list:
+        self.refresh()
+        return sorted(self.index["courses"])
+
+    def find(self, code, year=None):
+        """ returns the name a unit is stored under, for that handbook year,
+            or the latest year if year isn't given. None if there isn't one.
+        """
+        self.refresh()
+        years = self.by_code.get(code, {})
+        if year is None:
+            return years[max(years)] if len(years) > 0 else None
+        return years.get(str(year))
+
+    def read(self, offset, length) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def get_unit(self, name, text=False):
+        """returns the unit saved under name (with its page text if text is True) or None"""
+        self.refresh()
+        if name not in self.index["units"]:
+            return None
+        _, _, offset, length = self.index["units"][name]
+        instrument.count("persist.units_loaded")
+        with instrument.timer("persist.load"):
+            return decode_unit(self.read(offset, length), self.get_text(name) if text else None)
+
+    def get_text(self, name, data=None):
+        """the page text saved for the unit name, None if there isn't any"""
+        self.refresh()
+        if name not in self.index["texts"]:
+            return None
+        offset, length = self.index["texts"][name]
+        return decode_text(data[offset:offset + length] if data is not None else self.read(offset, length))
+
+    def load_units(self, names=None, data=None, text=False) -> dict:
+        """ returns {name: unit} for names (all units if names is None).
+            the file is read once from start to end and names not in the
+            catalog are left out. the page text is only loaded if text is True.
+        """
+        self.refresh()
+        entries = self.index["units"]
+        names = list(entries) if names is None else [n for n in names if n in entries]
+        if len(names) == 0:
+            return {}
+        started = instrument.start()
+        if data is None:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        view = memoryview(data)
+        units = {}
+        for name in names:
+            _, _, offset, length = entries[name]
+            units[name] = decode_unit(view[offset:offset + length], self.get_text(name, view) if text else None)
+        instrument.stop("persist.load", started)
+        instrument.count("persist.units_loaded", len(units))
+        return units
+
+    def get_course(self, name, load_units=True):
+        """ returns the course saved under name, with its unit list filled from the catalog.
+            with load_units=False the unit list only has the codes (ulist) and only
+            the course record is read.
+        """
+        self.refresh()
+        if name not in self.index["courses"]:
+            return None
+        instrument.count("persist.courses_loaded")
+        offset, length = self.index["courses"][name]
+        state = pickle.loads(self.read(offset, length))
+        for key in state.pop("unitlists", ["unitlist"]):
+            names = state[key]
+            unitlist = make(CLASSES["UnitList"], {"fname": "", "ulist": list(names)})
+            unitlist.units = self.load_units(names) if load_units and key == "unitlist" else {}
+            state[key] = unitlist
+        return make(CLASSES["Course"], state)
+
+    def put_unit(self, unit, name="") -> None:
+        with self.batch() as batch:
+            batch.put_unit(unit, name)
+
+    def put_course(self, course, name="") -> None:
+        with self.batch() as batch:
+            batch.put_course(course, name)
+
+    def delete_units(self, names) -> None:
+        with self.batch() as batch:
+            for name in names:
+                batch.delete_unit(name)
+
+    @contextmanager
+    def batch(self):
+        """ collects writes and commits them all at once when the block exits.
+            nothing is written if the block raises.
+        """
+        batch = Batch(self)
+        yield batch
+        batch.commit()
+
+
+class Batch:
+    """pending changes to a CatalogStore"""
+    def __init__(self, store) -> None:
+        self.store = store
+        self.units = {}         # name -> (code, year, bytes) or None to delete
+        self.texts = {}         # name -> page text bytes or None to drop it, others keep theirs
+        self.courses = {}
+        self.course_units = {}  # units that come with a course, only added if missing
+        self.source = store.index["source"]
+        self.compact = False    # True writes the whole file again, see commit
+
+    def put_unit(self, unit, name="") -> None:
+        """ a unit loaded without its page text keeps the saved one (and its handbook
+            year), a unit with page text replaces it.
+        """
+        name = unit.code if name == "" else name
+        state = state_of(unit)
+        self.store.refresh()
+        entries = self.store.index["units"]
+        if "text" not in state and name in entries:
+            code, year = entries[name][:2]
+        else:
+            code, year = unit_key(name, unit)
+        if "text" in state:
+            self.texts[name] = encode_text(state["text"]) if KEEP_TEXT else None
+        self.units[name] = (code, year, encode_unit(unit))
+
+    def delete_unit(self, name) -> None:
+        self.units[name] = None
+        self.texts[name] = None
+
+    def put_course(self, course, name="") -> None:
+        name = course.title if name == "" else name
+        state = state_of(course)
+        # unit lists (older courses have a second one, ulist) are saved as their unit names
+        state["unitlists"] = [key for key, value in state.items() if isinstance(value, CLASSES["UnitList"])]
+        for key in state["unitlists"]:
+            units = state[key].units
+            state[key] = list(units) if len(units) > 0 else list(getattr(state[key], "ulist", []))
+            for code, unit in units.items():
+                if unit is not None:
+                    self.course_units[code] = unit
+        self.courses[name] = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+
+    def commit(self) -> None:
+        """ writes the changes. the new records and a new index go on the end of the
+            file and the header is pointed at the new index last, so until then the
+            old index is still good and nothing else is read or rewritten. once less
+            than 1 / COMPACT of the file is records the index points at, the whole
+            catalog is written to a new file instead, which is swapped in.
+        """
+        store = self.store
+        started = instrument.start()
+        store.refresh()
+        for name, unit in self.course_units.items():
+            if name not in store.index["units"] and name not in self.units:
+                self.put_unit(unit, name)
+        index = {"units": {}, "courses": {}, "texts": {}, "source": self.source,
+                 "generation": store.index["generation"] + 1}
+        kept = {"units": {}, "courses": {}, "texts": {}}     # old records still in use
+        for name, entry in store.index["units"].items():
+            if name not in self.units:
+                kept["units"][name] = entry
+        for name, entry in store.index["courses"].items():
+            if name not in self.courses:
+                kept["courses"][name] = entry
+        for name, entry in store.index["texts"].items():
+            if name not in self.texts and (name in kept["units"] or self.units.get(name) is not None):
+                kept["texts"][name] = entry
+        added = (sum(len(entry[2]) for entry in self.units.values() if entry is not None)
+                 + sum(len(record) for record in self.courses.values())
+                 + sum(len(record) for record in self.texts.values() if record is not None))
+        live = added + sum(entry[-1] for entries in kept.values() for entry in entries.values())
+        if not self.compact and store.stamp is not None and store.stamp[1] + added <= COMPACT * live:
+            self.append(index, kept)
+        else:
+            self.rewrite(index, kept)
+        store.stamp = None      # the file can change without its mtime and size changing
+        store.refresh()
+        instrument.stop("persist.save", started)
+        instrument.count("persist.units_saved", sum(entry is not None for entry in self.units.values()))
+        instrument.count("persist.courses_saved", len(self.courses))
+
+    def write_new(self, f, index) -> None:
+        """writes the batch's records at the end of f, adding them to index"""
+        f.seek(0, os.SEEK_END)
+        for name, entry in self.units.items():
+            if entry is not None:
+                code, year, record = entry
+                index["units"][name] = (code, year, f.tell(), len(record))
+                f.write(record)
+        for name, record in self.courses.items():
+            index["courses"][name] = (f.tell(), len(record))
+            f.write(record)
+        for name, record in self.texts.items():
+            if record is not None and name in index["units"]:
+                index["texts"][name] = (f.tell(), len(record))
+                f.write(record)
+
+    def write_index(self, f, index) -> None:
+        """writes index at the end of f and points the header at it"""
+        f.seek(0, os.SEEK_END)
+        index_offset = f.tell()
+        pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(len(MAGIC))
+        f.write(HEADER.pack(index_offset))
+        f.flush()
+        os.fsync(f.fileno())
+
+    def append(self, index, kept) -> None:
+        """adds the batch to the end of the catalog file, old records stay where they are"""
+        for key, entries in kept.items():
+            index[key].update(entries)
+        with open(self.store.path, "r+b") as f:
+            self.write_new(f, index)
+            self.write_index(f, index)
+
+    def rewrite(self, index, kept) -> None:
+        """writes the whole catalog to a new file next to the old one and swaps it in"""
+        store = self.store
+        data = b""
+        if store.stamp is not None:
+            with open(store.path, "rb") as f:
+                data = f.read()
+        tmp = store.path.with_name(store.path.name + ".tmp")
+        store.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w+b") as f:
+            f.write(MAGIC + HEADER.pack(0))
+            for name, (code, year, offset, length) in kept["units"].items():
+                index["units"][name] = (code, year, f.tell(), length)
+                f.write(data[offset:offset + length])
+            for key in ("courses", "texts"):
+                for name, (offset, length) in kept[key].items():
+                    index[key][name] = (f.tell(), length)
+                    f.write(data[offset:offset + length])
+            self.write_new(f, index)
+            self.write_index(f, index)
+        os.replace(tmp, store.path)
+
+
+def snapshot(store=None, path=SNAPSHOT_PATH) -> CatalogStore:
+    """writes a snapshot of store (default the catalog at CATALOG_PATH) to path"""
+    store = CatalogStore() if store is None else store
+    store.refresh()
+    units = store.load_units()
+    courses = {name: store.get_course(name, load_units=False) for name in store.course_names()}
+    pathlib.Path(path).unlink(missing_ok=True)
+    out = CatalogStore(path)
+    with out.batch() as batch:
+        batch.source = store.index["generation"]
+        for name, unit in units.items():
+            code, year = store.index["units"][name][:2]
+            batch.units[name] = (code, year, encode_unit(unit, details=False))
+        for name, course in courses.items():
+            course.text = ""
+            batch.put_course(course, name)
+    return out
+
+
+def open_snapshot(store=None, path=SNAPSHOT_PATH) -> CatalogStore:
+    """ the snapshot at path, made again first if it's missing or made from another
+        generation of store
+    """
+    store = CatalogStore() if store is None else store
+    store.stamp = None      # the generation as it is in the file now
+    store.refresh()
+    out = CatalogStore(path)
+    out.refresh()
+    if out.stamp is None or out.index["source"] != store.index["generation"]:
+        out = snapshot(store, path)
+    return out
+
+
+def upgrade(path=CATALOG_PATH) -> CatalogStore:
+    """ rewrites every record of the catalog at path in the current format.
+        saved page text is cut down to the unit details (see extract.region).
+    """
+    import extract
+    import prerequisite_checker
+    register(Unit=prerequisite_checker.Unit, UnitList=prerequisite_checker.UnitList,
+             Course=prerequisite_checker.Course)
+    store = CatalogStore(path)
+    size = store.path.stat().st_size
+    units = store.load_units(text=True)
+    courses = {name: store.get_course(name) for name in store.course_names()}
+    with store.batch() as batch:
+        batch.compact = True
+        for name, unit in units.items():
+            if hasattr(unit, "text"):
+                unit.text = extract.region(unit.text)
+            batch.put_unit(unit, name)
+        for name, course in courses.items():
+            batch.put_course(course, name)
+    print(f"{len(units)} units and {len(courses)} courses rewritten, {size} -> {store.path.stat().st_size} bytes")
+    return store
+
+
+def migrate(unit_path="./units/", course_path="./courses/", path=CATALOG_PATH) -> CatalogStore:
+    """ copies every old pickle in unit_path and course_path into the catalog at path.
+        units saved in units/ win over the copies embedded in course files.
+    """
+    import prerequisite_checker
+    register(Unit=prerequisite_checker.Unit, UnitList=prerequisite_checker.UnitList,
+             Course=prerequisite_checker.Course)
+    store = CatalogStore(path)
+    with store.batch() as batch:
+        for f in sorted(pathlib.Path(course_path).iterdir()):
+            if f.is_file() and not f.name.startswith("."):
+                batch.put_course(load_pickle(f), f.name)
+                print(f"course: {f.name}")
+        for f in sorted(pathlib.Path(unit_path).iterdir()):
+            if f.is_file() and not f.name.startswith("."):
+                batch.put_unit(load_pickle(f), f.name)
+                print(f"unit: {f.name}")
+    print(f"{len(store.unit_names())} units and {len(store.course_names())} courses in {store.path}")
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        migrate(*sys.argv[2:5])
+    elif len(sys.argv) > 1 and sys.argv[1] == "upgrade":
+        upgrade(*sys.argv[2:3])
+    elif len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+        import prerequisite_checker
+        register(Unit=prerequisite_checker.Unit, UnitList=prerequisite_checker.UnitList,
+                 Course=prerequisite_checker.Course)
+        source = CatalogStore(*sys.argv[2:3])
+        out = snapshot(source, *sys.argv[3:4])
+        print(f"{out.path}: {out.path.stat().st_size} bytes ({source.path.stat().st_size} in {source.path})")
+    else:
+        print(__doc__)
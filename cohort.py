@@ -0,0 +1,113 @@
+"""
+    checks a whole cohort of students against a course at once.
+    completed units are a boolean matrix (one row per student, one column per
+    unit code) and every unit's prerequisite expression is evaluated over whole
+    columns with numpy, so the work grows with the number of units, not the
+    number of students.
+
+        course = Course().load("Computing and Data Science")
+        columns = ["CITS1401", "CITS1402", ...]
+        done = completed_matrix(transcripts, columns)     # or your own 0/1 matrix
+        result = check_cohort(done, columns, course)
+        result.status[:, result.units.index("CITS2200 2024")]
+"""
+
+import re
+
+import numpy as np
+
+import prereq
+
+# values in CohortResult.status
+ELIGIBLE = 0        # prerequisites met, nothing incompatible done
+MISSING = 1         # prerequisites not met
+INCOMPATIBLE = 2    # an incompatible unit has been completed
+COMPLETED = 3       # already done this unit
+
+CODE = re.compile(r'\b[a-zA-Z]{4}\d{4}\b')
+
+
+def completed_matrix(transcripts, columns) -> np.ndarray:
+    """ turns a list of transcripts (each an iterable of unit codes) into the
+        boolean matrix check_cohort takes. codes not in columns are ignored.
+    """
+    index = {code: i for i, code in enumerate(columns)}
+    done = np.zeros((len(transcripts), len(columns)), dtype=bool)
+    for row, transcript in enumerate(transcripts):
+        cols = [index[code] for code in transcript if code in index]
+        done[row, cols] = True
+    return done
+
+
+class CohortResult:
+    """ status is a (students, units) array of ELIGIBLE/MISSING/INCOMPATIBLE/COMPLETED.
+        units are the unit names in column order of status.
+    """
+    def __init__(self, units, status, exprs, done, columns) -> None:
+        self.units = units
+        self.status = status
+        self.exprs = exprs
+        self.done = done
+        self.columns = columns
+
+    def counts(self) -> dict:
+        """number of students in each state for every unit"""
+        return {name: {"eligible": int(np.sum(self.status[:, i] == ELIGIBLE)),
+                       "missing": int(np.sum(self.status[:, i] == MISSING)),
+                       "incompatible": int(np.sum(self.status[:, i] == INCOMPATIBLE)),
+                       "completed": int(np.sum(self.status[:, i] == COMPLETED))}
+                for i, name in enumerate(self.units)}
+
+    def missing(self, student, unit):
+        """the prerequisites still missing for one student and unit (an expression, see prereq.py)"""
+        completed = {code for code, done in zip(self.columns, self.done[student]) if done}
+        return prereq.remaining(self.exprs[self.units.index(unit)], completed)
+
+
+def evaluate(expr, done, index):
+    """ evaluates an expression for every student at once.
+        returns a boolean column, or True when the expression needs nothing.
+    """
+    if expr is None:
+        return True
+    if isinstance(expr, str):
+        if expr in index:
+            return done[:, index[expr]]
+        return False
+    terms = [evaluate(term, done, index) for term in expr[1:]]
+    if expr[0] == "and":
+        if any(term is False for term in terms):
+            return False
+        columns = [term for term in terms if term is not True]
+        return np.logical_and.reduce(columns) if len(columns) > 0 else True
+    if any(term is True for term in terms):
+        return True
+    columns = [term for term in terms if term is not False]
+    return np.logical_or.reduce(columns) if len(columns) > 0 else False
+
+
+def check_cohort(done, columns, course) -> CohortResult:
+    """ checks every student (rows of done) against every unit in the course.
+        columns are the unit codes of the columns of done.
+    """
+    done = np.asarray(done, dtype=bool)
+    index = {code: i for i, code in enumerate(columns)}
+    units = [name for name, unit in course.unitlist.units.items() if unit is not None]
+    status = np.full((done.shape[0], len(units)), ELIGIBLE, dtype=np.int8)
+    exprs = []
+    for i, name in enumerate(units):
+        unit = course.unitlist.units[name]
+        expr = unit.get_prereq_expr()
+        exprs.append(expr)
+        met = evaluate(expr, done, index)
+        if met is False:
+            status[:, i] = MISSING
+        elif met is not True:
+            status[~met, i] = MISSING
+        incompatible = [index[code] for code in CODE.findall(getattr(unit, "incompatibility", ""))
+                        if code in index]
+        if len(incompatible) > 0:
+            status[done[:, incompatible].any(axis=1), i] = INCOMPATIBLE
+        if name[:8] in index:
+            status[done[:, index[name[:8]]], i] = COMPLETED
+    return CohortResult(units, status, exprs, done, columns)
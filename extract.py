@@ -0,0 +1,174 @@
+"""
+    pulls the text the program needs out of handbook pages.
+    a unit page is cut down to its unit details before it's parsed: the page
+    title, the "UWA Handbook" line and the unit title, then everything from
+    "Unit Overview" to the end of the detail lists, the <dl>s of <dt> headings
+    ("Description", "Credit", ...) and <dd> values. the "Studying online" banner,
+    the glossary of modes, the breadcrumbs and the footer are left out, so
+    there's less to parse and less page text is saved with every unit. the html
+    after the notes at the bottom ("The availability of units ...") isn't parsed.
+    a page without detail lists is cut by the same lines of text instead
+    (see region()), and if it doesn't look like that either, all of it is used.
+
+    text is taken the way BeautifulSoup's get_text() takes it (every piece of
+    text except scripts, styles and comments), by one of the BACKENDS:
+        lxml            used when it's installed
+        html.parser     the standard library parser, streamed, no tree is built
+        bs4             BeautifulSoup with html.parser, how it used to be done
+"""
+
+import importlib.util
+from html.parser import HTMLParser
+
+BACKENDS = ("lxml", "html.parser", "bs4")
+BACKEND = None      # None picks lxml if it's installed, html.parser otherwise
+SKIP = ("script", "style", "template")      # tags whose text isn't page text
+START = ("Unit Overview", "Description")    # first line of the unit details
+END = "The availability of units in Semester"     # first line after them
+# <dt> headings of the unit detail lists, a <dl> with one of them is a detail list
+DETAILS = ("Description", "Credit", "Offering", "Outcomes", "Assessment", "Unit Coordinator",
+           "Prerequisites", "Incompatibility")
+
+
+class TextParser(HTMLParser):
+    """collects the text of a page, leaving out SKIP tags"""
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP:
+            self.skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP and self.skipping > 0:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if self.skipping == 0:
+            self.parts.append(data)
+
+
+class DetailParser(TextParser):
+    """ collects the text of a page like TextParser, and where the unit detail
+        lists are in it: spans is [(first part, part after)] of every detail list.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.spans = []
+        self.depth = 0          # <dl>s the parser is in
+        self.start = 0          # first part of the outer <dl>
+        self.label = None       # first part of the open <dt>
+        self.detail = False     # the outer <dl> has a DETAILS heading
+
+    def heading(self):
+        if self.label is not None:
+            self.detail = self.detail or "".join(self.parts[self.label:]).strip().startswith(DETAILS)
+            self.label = None
+
+    def handle_starttag(self, tag, attrs):
+        super().handle_starttag(tag, attrs)
+        if tag == "dl":
+            if self.depth == 0:
+                self.start = len(self.parts)
+                self.detail = False
+            self.depth += 1
+        elif tag in ("dt", "dd") and self.depth > 0:
+            self.heading()      # </dt> can be left out
+            if tag == "dt":
+                self.label = len(self.parts)
+
+    def handle_endtag(self, tag):
+        super().handle_endtag(tag)
+        if tag == "dt":
+            self.heading()
+        elif tag == "dl" and self.depth > 0:
+            self.heading()
+            self.depth -= 1
+            if self.depth == 0 and self.detail:
+                self.spans.append((self.start, len(self.parts)))
+
+
+def backend() -> str:
+    global BACKEND
+    if BACKEND is None:
+        BACKEND = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+    return BACKEND
+
+
+def lxml_text(html) -> str:
+    from lxml import etree
+    from lxml import html as lxml_html
+    root = lxml_html.document_fromstring(html)
+    etree.strip_elements(root, etree.Comment, etree.ProcessingInstruction, *SKIP, with_tail=False)
+    return "".join(root.itertext())
+
+
+def text(html) -> str:
+    """all the text of the page"""
+    name = backend()
+    if name == "lxml" and html.strip():
+        try:
+            return lxml_text(html)
+        except ValueError:      # lxml's ParserError, fall through to html.parser
+            pass
+    if name == "bs4":
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html, "html.parser").get_text()
+    parser = TextParser()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.parts)
+
+
+def lines(html) -> list:
+    """the non-empty lines of text on a page, stripped"""
+    return [s.strip() for s in text(html).splitlines() if s.strip()]
+
+
+def region(lines) -> list:
+    """ the unit details of a unit page's lines (see the top of the file),
+        all the lines if the markers aren't there.
+    """
+    header = next((i for i, line in enumerate(lines) if line.startswith("UWA Handbook ")), None)
+    start = next((i for i, line in enumerate(lines) if line in START), None)
+    if header is None or start is None or start <= header:
+        return lines
+    end = next((i for i in range(start, len(lines)) if lines[i].startswith(END)), len(lines))
+    return lines[:header + 2] + lines[start:end]
+
+
+def details(html):
+    """ the unit details of a unit page from its detail lists (see the top of the
+        file), as lines. None if the page has none.
+    """
+    parser = DetailParser()
+    parser.feed(html)
+    parser.close()
+    if len(parser.spans) == 0:
+        return None
+    first, last = parser.spans[0][0], parser.spans[-1][1]
+    head = [s.strip() for s in "".join(parser.parts[:first]).splitlines() if s.strip()]
+    header = next((i for i, line in enumerate(head) if line.startswith("UWA Handbook ")), None)
+    if header is None:
+        return None
+    # "Unit Overview" and a "Description" heading outside the lists
+    start = next((i for i in range(header + 2, len(head)) if head[i] in START), len(head))
+    body = [s.strip() for s in "".join(parser.parts[first:last]).splitlines() if s.strip()]
+    return head[:header + 2] + head[start:] + body
+
+
+def unit_lines(html) -> list:
+    """the unit details of a unit page, as lines"""
+    end = html.find(END)
+    if "<dl" in html:
+        for page in ((html[:end], html) if end >= 0 else (html,)):
+            found = details(page)
+            if found is not None:
+                return found
+    if end >= 0:
+        found = region(lines(html[:end]))
+        if any(line in START for line in found):
+            return found
+    return region(lines(html))
@@ -0,0 +1,340 @@
+"""
+    shared fetching layer for the UWA handbook.
+    keeps one pooled http session (keep-alive connections are reused between
+    requests) and a small thread pool crawler with a requests-per-second cap
+    so we don't hammer the handbook server.
+    pages are kept in an on-disk cache (raw html + ETag/Last-Modified) and
+    revalidated with conditional GETs, so only changed pages are downloaded again.
+    missing() checks whether lots of pages still exist with HEAD requests only.
+    requests is only imported when the first request is sent, so programs that
+    only use the catalog start quickly.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import instrument
+
+WORKERS = 8         # default number of concurrent fetches
+RATE = 10.0         # default cap on requests per second (None or 0 for no cap)
+TIMEOUT = 30        # seconds before giving up on a single page
+CACHE_PATH = "./cache/"
+CACHE_TTL = 24 * 60 * 60            # seconds a cached page is used without asking the server
+CACHE_SIZE = 200 * 1024 * 1024      # bytes kept on disk before the oldest pages are evicted
+OFFLINE = False     # if True, only cached pages are used and nothing is fetched
+CHECK_WORKERS = 32  # default concurrency for status-only checks (see missing)
+CHECK_RATE = 100.0  # default requests per second for status-only checks
+GONE = (404, 410)   # statuses meaning the page doesn't exist
+RETRIES = 3         # times a throttled (429) or unavailable (503) request is tried again
+BACKOFF = 1.0       # seconds to wait before the first retry if the server doesn't say, doubled each time
+# send every request to this server instead (e.g. "http://localhost:8000", see standin.py).
+# the path and query of the original url are kept. can be set with HANDBOOK_BASE_URL.
+BASE_URL = os.environ.get("HANDBOOK_BASE_URL") or None
+
+_session = None
+_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=WORKERS) -> "requests.Session":
+    """returns the shared session, making it the first time.
+       the connection pool is sized so every worker can keep its own connection alive,
+       and grown if a later caller wants more workers.
+    """
+    global _session, _pool_size
+    import requests
+    from requests.adapters import HTTPAdapter
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        if pool_size > _pool_size:
+            _pool_size = max(pool_size, WORKERS)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_pool_size)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def rebase(url) -> str:
+    """url pointed at BASE_URL if it's set"""
+    if not BASE_URL:
+        return url
+    base = urlsplit(BASE_URL)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, base.path.rstrip("/") + parts.path, parts.query, ""))
+
+
+def get(url, timeout=TIMEOUT, headers=None) -> "requests.Response":
+    """ GET the url through the shared session.
+        throttled (429) and unavailable (503) responses are retried up to RETRIES
+        times, waiting as long as the Retry-After header says.
+    """
+    url = rebase(url)
+    wait = BACKOFF
+    for attempt in range(RETRIES + 1):
+        started = instrument.start()
+        response = get_session().get(url, timeout=timeout, headers=headers)
+        if started is not None:
+            instrument.stop("fetch.http", started)
+            instrument.count("fetch.requests")
+            instrument.count("fetch.bytes", len(response.content))
+        if response.status_code not in (429, 503) or attempt == RETRIES:
+            return response
+        instrument.count("fetch.retries")
+        try:
+            delay = float(response.headers.get("Retry-After", wait))
+        except ValueError:
+            delay = wait
+        time.sleep(min(delay, 60))
+        wait *= 2
+    return response
+
+
+class Page:
+    """the bits of a response the rest of the program uses"""
+    def __init__(self, url, status_code, text="", from_cache=False) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.from_cache = from_cache
+
+
+class ResponseCache:
+    """ on-disk cache of raw page bodies keyed by url.
+        each page is two files named by the hash of the url:
+        <key>.html holds the body and <key>.json the url, ETag, Last-Modified and
+        when the page was last checked with the server.
+        the .json file's mtime is bumped on every hit and used for LRU eviction
+        once the cache grows past max_size bytes.
+    """
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_size=CACHE_SIZE) -> None:
+        self.path = pathlib.Path(path)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.size = None    # total bytes on disk, worked out on first store
+        self.lock = threading.Lock()
+
+    def key(self, url) -> str:
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def lookup(self, url):
+        """returns (meta, body) for the url or None if it isn't cached"""
+        key = self.key(url)
+        try:
+            with open(self.path / (key + ".json")) as f:
+                meta = json.load(f)
+            with open(self.path / (key + ".html"), encoding="utf-8") as f:
+                body = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        os.utime(self.path / (key + ".json"))
+        return meta, body
+
+    def is_fresh(self, meta, max_age=None) -> bool:
+        """True if the page was checked less than max_age (default ttl) seconds ago"""
+        max_age = self.ttl if max_age is None else max_age
+        return max_age is not None and time.time() - meta["checked"] < max_age
+
+    def store(self, url, body, etag=None, modified=None) -> None:
+        """saves the page and evicts old pages if the cache is too big"""
+        key = self.key(url)
+        meta = {"url": url, "etag": etag, "modified": modified,
+                "checked": time.time(), "size": len(body.encode("utf-8"))}
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            old = self.entry_size(key)
+            self.write(key + ".html", body)
+            self.write(key + ".json", json.dumps(meta))
+            if self.size is not None:
+                self.size += meta["size"] - old
+        self.evict()
+
+    def touch(self, url, meta) -> None:
+        """records that the server said the cached page is still current"""
+        meta["checked"] = time.time()
+        self.write(self.key(url) + ".json", json.dumps(meta))
+
+    def write(self, name, data) -> None:
+        """write through a temp file so a crash never leaves half a page behind"""
+        tmp = self.path / f"{name}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path / name)
+
+    def entry_size(self, key) -> int:
+        try:
+            return (self.path / (key + ".html")).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def evict(self) -> None:
+        """drop the least recently used pages until the cache fits in max_size"""
+        if not self.max_size:
+            return
+        with self.lock:
+            if self.size is None:
+                self.size = sum(f.stat().st_size for f in self.path.glob("*.html"))
+            if self.size <= self.max_size:
+                return
+            metas = sorted(self.path.glob("*.json"), key=lambda f: f.stat().st_mtime)
+            for meta in metas:
+                if self.size <= self.max_size:
+                    break
+                key = meta.name[:-len(".json")]
+                self.size -= self.entry_size(key)
+                (self.path / (key + ".html")).unlink(missing_ok=True)
+                meta.unlink(missing_ok=True)
+
+    def discard(self, url) -> None:
+        """forget the cached page for url"""
+        key = self.key(url)
+        with self.lock:
+            if self.size is not None:
+                self.size -= self.entry_size(key)
+            (self.path / (key + ".html")).unlink(missing_ok=True)
+            (self.path / (key + ".json")).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """removes every cached page"""
+        with self.lock:
+            for f in list(self.path.glob("*.html")) + list(self.path.glob("*.json")):
+                f.unlink(missing_ok=True)
+            self.size = 0
+
+
+cache = ResponseCache()
+
+
+def fetch(url, max_age=None) -> Page:
+    """ returns the page for the url, using the cache where possible.
+        a cached page younger than max_age seconds (default cache.ttl) is returned
+        without touching the network. an older one is revalidated with a
+        conditional GET and only downloaded again if the server says it changed.
+        pass max_age=0 to always check with the server.
+        when OFFLINE is set, cached pages are returned whatever their age.
+    """
+    url = rebase(url)
+    cached = cache.lookup(url) if cache is not None else None
+    if cached is not None:
+        meta, body = cached
+        if OFFLINE or cache.is_fresh(meta, max_age):
+            instrument.count("cache.hits")
+            return Page(url, 200, body, True)
+    instrument.count("cache.misses")
+    if OFFLINE:
+        return Page(url, 404)
+
+    headers = {}
+    if cached is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("modified"):
+            headers["If-Modified-Since"] = meta["modified"]
+    response = get(url, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        instrument.count("cache.revalidated")
+        cache.touch(url, meta)
+        return Page(url, 200, body, True)
+    if response.status_code == 200 and cache is not None:
+        cache.store(url, response.text, response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"))
+    return Page(url, response.status_code, response.text)
+
+
+class RateLimiter:
+    """hands out evenly spaced time slots so at most rate calls start per second.
+       safe to share between threads.
+    """
+    def __init__(self, rate=RATE) -> None:
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        """block until the caller is allowed to make its request"""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def crawl(items, fetch, workers=WORKERS, rate=RATE):
+    """ calls fetch(item) for every item using a pool of workers and yields
+        (item, result) pairs as soon as each one finishes (not in input order).
+        items can be a lazy generator, only about 2 * workers items are in flight
+        at a time so a huge sweep doesn't queue everything up front.
+        if fetch raises, the exception is yielded as the result.
+    """
+    workers = max(1, workers)
+    limiter = RateLimiter(rate)
+    get_session(workers)
+
+    def task(item):
+        limiter.wait()
+        return fetch(item)
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < 2 * workers:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(task, item)] = item
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    yield item, future.result()
+                except Exception as e:
+                    yield item, e
+
+
+def head(url, timeout=TIMEOUT) -> int:
+    """ the status code for url without downloading the page.
+        sends a HEAD request, or if the server doesn't allow those, a streamed GET
+        that is closed as soon as the status line and headers are in.
+    """
+    url = rebase(url)
+    instrument.count("fetch.checks")
+    session = get_session()
+    response = session.head(url, timeout=timeout, allow_redirects=True)
+    if response.status_code in (405, 501):
+        with session.get(url, timeout=timeout, stream=True) as response:
+            return response.status_code
+    return response.status_code
+
+
+def missing(items, url, workers=CHECK_WORKERS, rate=CHECK_RATE) -> list:
+    """ checks the pages url + item for every item (e.g. unit codes) concurrently
+        and returns the items whose page is gone (GONE statuses), sorted.
+        items that couldn't be checked (errors, other statuses) are never returned,
+        and nothing is checked when OFFLINE is set. cached copies of gone pages are dropped.
+    """
+    if OFFLINE:
+        return []
+    gone = []
+    for item, status in crawl(items, lambda item: head(url + item), workers, rate):
+        if not isinstance(status, Exception) and status in GONE:
+            gone.append(item)
+            if cache is not None:
+                cache.discard(url + item)
+    return sorted(gone)
@@ -0,0 +1,176 @@
+"""
+    timers and counters for the slow parts of the program, so we can tell where
+    a refresh or a plan spends its time:
+        fetch.*     http requests to the handbook (fetch.http, fetch.bytes, ...)
+        cache.*     handbook page cache hits, revalidations and misses
+        parse.*     html -> lines (parse.html) and lines -> Unit (parse.sections)
+        persist.*   reading and writing the catalog
+        prereq.*    prerequisite checks
+        plan.*      study plans
+    everything is off by default and costs a flag check when off.
+    turn it on with enable(), or by setting the INSTRUMENT environment variable
+    to a file the numbers are written to (as json) when the program exits:
+        INSTRUMENT=stats.json python prerequisite_checker.py
+
+    in the code:
+        with instrument.timer("plan"):
+            ...
+        started = instrument.start()
+        ...
+        instrument.stop("parse.sections", started)
+        instrument.count("fetch.bytes", len(body))
+        print(instrument.snapshot())
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLED = False
+
+_lock = threading.Lock()
+_counters = {}
+_timers = {}        # name -> [calls, total seconds, longest]
+_dump_path = None
+
+
+def enable(dump=None) -> None:
+    """ starts collecting. if dump is a file name, snapshot() is written there
+        as json when the program exits.
+    """
+    global ENABLED, _dump_path
+    ENABLED = True
+    if dump:
+        if _dump_path is None:
+            atexit.register(_dump_at_exit)
+        _dump_path = dump
+
+
+def disable() -> None:
+    global ENABLED
+    ENABLED = False
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+
+
+def count(name, n=1) -> None:
+    """adds n to the counter name"""
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def add(name, seconds) -> None:
+    """adds one timed call of seconds to the timer name"""
+    with _lock:
+        entry = _timers.get(name)
+        if entry is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+def start():
+    """the time to pass to stop(), None when not collecting"""
+    return time.perf_counter() if ENABLED else None
+
+
+def stop(name, started) -> None:
+    """adds the time since start() to the timer name"""
+    if started is not None:
+        add(name, time.perf_counter() - started)
+
+
+class Timer:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name) -> None:
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_TIMER = NoTimer()
+
+
+def timer(name):
+    """context manager timing its block under name"""
+    return Timer(name) if ENABLED else NO_TIMER
+
+
+def timed(name):
+    """decorator timing every call of the function under name"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                add(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def snapshot() -> dict:
+    """ the numbers so far:
+        {"counters": {name: n}, "timers": {name: {calls, total, mean, max}}}
+        times are in seconds.
+    """
+    with _lock:
+        counters = dict(_counters)
+        timers = {name: {"calls": calls, "total": total, "mean": total / calls, "max": longest}
+                  for name, (calls, total, longest) in _timers.items()}
+    return {"counters": dict(sorted(counters.items())), "timers": dict(sorted(timers.items()))}
+
+
+def dump(path) -> None:
+    """writes snapshot() to path as json"""
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=1)
+
+
+def report() -> str:
+    """snapshot() as a few lines of text"""
+    snap = snapshot()
+    lines = [f"{name:24} {t['calls']:8} calls {t['total'] * 1000:10.1f} ms  (max {t['max'] * 1000:.1f} ms)"
+             for name, t in snap["timers"].items()]
+    lines += [f"{name:24} {n:8}" for name, n in snap["counters"].items()]
+    return "\n".join(lines)
+
+
+def _dump_at_exit() -> None:
+    if _dump_path:
+        dump(_dump_path)
+
+
+if os.environ.get("INSTRUMENT"):
+    enable(os.environ["INSTRUMENT"])
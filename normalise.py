@@ -0,0 +1,113 @@
+"""
+    fixes the prerequisite and incompatibility text scraped from the handbook
+    ("Bachel or" -> "Bachelor", "FoundationsandCITS1401" -> "Foundations and CITS1401",
+    "6 points of programming" -> "CITS1401 or CITX1401", ...).
+    the rules are in normalise_rules.json, not in the code, as named rule sets:
+        prereq              the prerequisites line of a unit page
+        incompatibility     the incompatibility line of a unit page
+        names               unit names in prerequisites, run on every save as well
+    a rule set is a list of passes made one after the other, like the str.replace
+    chain they replace, so a rule that cleans up after another (the double space
+    "Enrolment in " leaves) goes in a later pass. every pass is one pattern of all
+    its rules, compiled when the rules are read, and made in one go over the text.
+        normalise("prereq", text)
+    every rule that fires is counted in FIRED ({(rule set, text found): times}),
+    pass a list as fired to get the ones for one text.
+    after changing the rules, prerequisite_checker.check_rules() lists the saved
+    units whose prerequisites or incompatibility would come out different, and
+    prerequisite_checker.renormalise() redoes them from their saved page text,
+    nothing is fetched.
+"""
+
+import json
+import pathlib
+import re
+import threading
+from collections import Counter
+
+RULES_PATH = pathlib.Path(__file__).resolve().parent / "normalise_rules.json"
+FIRED = Counter()
+
+_lock = threading.Lock()
+_rules = None       # rule set name -> [RulePass], see rules()
+
+
+def alternation(tree) -> str:
+    """ the regex for a tree of rules ({character: subtree}, "" where a rule ends),
+        the longer rule first where one carries on from another
+    """
+    branches = [re.escape(ch) + alternation(subtree) for ch, subtree in sorted(tree.items()) if ch != ""]
+    if len(branches) == 0:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return f"(?:{body})?" if "" in tree else body
+
+
+def pattern(finds):
+    """ one pattern of all the finds, longest match at a place wins. the rules are
+        put together by their common beginnings, so a place in the text is given
+        up on its first character instead of trying every rule there.
+    """
+    tree = {}
+    for find in finds:
+        node = tree
+        for ch in find:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return re.compile(alternation(tree))
+
+
+class RulePass:
+    """one pass of a rule set, {text: replacement}, as one pattern of all its rules"""
+    __slots__ = ("name", "replacements", "pattern")
+
+    def __init__(self, name, replacements) -> None:
+        self.name = name
+        self.replacements = dict(replacements)
+        self.pattern = pattern(self.replacements)
+
+    def apply(self, text, fired=None) -> str:
+        found = []
+
+        def replace(match):
+            find = match.group()
+            found.append(find)
+            return self.replacements[find]
+        text = self.pattern.sub(replace, text)
+        if len(found) == 0:
+            return text
+        with _lock:
+            FIRED.update((self.name, find) for find in found)
+        if fired is not None:
+            fired.extend((self.name, find) for find in found)
+        return text
+
+
+def load(path=RULES_PATH) -> dict:
+    """the rule sets in the file, {name: [RulePass]} (keys starting with _ are comments)"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {name: [RulePass(name, replacements) for replacements in passes]
+            for name, passes in data.items() if not name.startswith("_")}
+
+
+def rules(reload=False) -> dict:
+    """the rule sets from RULES_PATH, read the first time they're needed"""
+    global _rules
+    if _rules is None or reload:
+        _rules = load(RULES_PATH)
+    return _rules
+
+
+def normalise(name, text, fired=None) -> str:
+    """ text with the rule set name applied. if fired is a list, (rule set, text
+        found) is added to it for every rule that fired.
+    """
+    for rule_pass in rules().get(name, ()):
+        text = rule_pass.apply(text, fired)
+    return text
+
+
+def report() -> str:
+    """how often each rule fired, most first"""
+    return "\n".join(f"{n:6}  {name:16} {find!r}" for (name, find), n in FIRED.most_common())
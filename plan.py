@@ -0,0 +1,131 @@
+"""
+    quick start: the study plan for a saved course, read from the catalog snapshot
+    (see catalog.py), which is made the first time and again whenever the
+    catalog changes.
+        python plan.py "Computing and Data Science"
+        python plan.py "Data Science 2024" --intake 2 --strict
+    or every saved course for both intakes, worked out in parallel (a process per
+    core) and written as one json line per plan as they finish:
+        python plan.py --all --workers 4 --out plans.jsonl
+    the workers share the snapshot, it's loaded once before they start (forked
+    workers get it as it is, others load it from the snapshot file once each).
+    only the standard library and this program's own modules are loaded,
+    requests and BeautifulSoup only come in when a page is fetched or parsed.
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import catalog
+import prerequisite_checker as pc
+import scheduler
+
+
+def load_course(name, snapshot=catalog.SNAPSHOT_PATH) -> tuple:
+    """ (the course saved under name, None if there isn't one, and the snapshot of
+        the catalog it's from, to load the rest of its units from)
+    """
+    store = catalog.open_snapshot(pc.STORE, snapshot)
+    return store.get_course(name), store
+
+
+# {course name: Course} of the snapshot in a batch run, filled before the workers start
+_courses = {}
+
+
+def load_courses(snapshot) -> None:
+    """loads every course of the snapshot with its units into _courses, once"""
+    if len(_courses) > 0:
+        return
+    store = catalog.CatalogStore(snapshot)
+    for name in store.course_names():
+        course = store.get_course(name)
+        course.load_plan_units(store)
+        _courses[name] = course
+
+
+def plan_course(name, intake, strict=False) -> dict:
+    """ one plan of a batch run, {"course", "intake", "semesters", "warnings", "seconds"}
+        or {"course", "intake", "error", "constraint", "units", "seconds"}
+    """
+    started = time.perf_counter()
+    result = {"course": name, "intake": intake}
+    try:
+        plan = scheduler.schedule(_courses[name], intake, strict=strict)
+        result.update(semesters=plan.semesters, warnings=plan.warnings)
+    except scheduler.PlanError as e:
+        result.update(error=str(e), constraint=e.constraint, units=e.units)
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def plan_all(names=None, intakes=(1, 2), strict=False, workers=None, snapshot=catalog.SNAPSHOT_PATH):
+    """ yields the plan (see plan_course) of every course (default all saved ones)
+        for every intake as they finish, worked out by a pool of worker processes
+        (default one per core, 1 works them out here).
+    """
+    store = catalog.open_snapshot(pc.STORE, snapshot)
+    load_courses(str(store.path))
+    names = sorted(_courses) if names is None else [name for name in names if name in _courses]
+    jobs = [(name, intake, strict) for name in names for intake in intakes]
+    if workers == 1:
+        for job in jobs:
+            yield plan_course(*job)
+        return
+    with ProcessPoolExecutor(workers, initializer=load_courses, initargs=(str(store.path),)) as pool:
+        for future in as_completed([pool.submit(plan_course, *job) for job in jobs]):
+            yield future.result()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="study plan for a saved course")
+    parser.add_argument("course", nargs="?", help="name the course is saved under")
+    parser.add_argument("--all", action="store_true", help="every saved course, both intakes")
+    parser.add_argument("--workers", type=int, default=None, help="processes for --all (default one per core)")
+    parser.add_argument("--out", default=None, help="file for the --all plans (default the screen)")
+    parser.add_argument("--intake", type=int, default=1, choices=[1, 2])
+    parser.add_argument("--strict", action="store_true", help="don't relax prerequisites outside the course")
+    parser.add_argument("--snapshot", default=catalog.SNAPSHOT_PATH)
+    args = parser.parse_args(argv)
+    if args.all:
+        return batch(args)
+    if args.course is None:
+        parser.error("give a course or --all")
+
+    course, store = load_course(args.course, args.snapshot)
+    if course is None:
+        print(f"this course: {args.course}, doesn't exist... try making it...")
+        return 1
+    try:
+        semesters = course.get_study_plan(args.intake, strict=args.strict, store=store)
+    except scheduler.PlanError as e:
+        print(e)
+        return 1
+    for semester, units in semesters.items():
+        print(f"{semester}: {', '.join(units)}")
+    return 0
+
+
+def batch(args) -> int:
+    """--all: every plan as one json line, written as soon as it's worked out"""
+    started = time.perf_counter()
+    out = sys.stdout if args.out is None else open(args.out, "w")
+    n = failed = 0
+    try:
+        for n, result in enumerate(plan_all(strict=args.strict, workers=args.workers,
+                                            snapshot=args.snapshot), 1):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            failed += "error" in result
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{n} plans ({failed} failed) in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 1 if failed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
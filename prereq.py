@@ -0,0 +1,338 @@
+"""
+    boolean expressions for unit prerequisites.
+    the handbook text is turned into an AND/OR tree which can be checked
+    directly against a set of completed units, instead of expanding every
+    combination of alternatives into a list first.
+
+    an expression is one of
+        None                        no unit needs to be completed
+        "CITS1401"                  that unit needs to be completed
+        ("or", expr, expr, ...)     any one of them
+        ("and", expr, expr, ...)    all of them
+    the handbook writes "A or B and C or D" meaning (A or B) and (C or D), so
+    "or" binds tighter than "and". brackets are respected where they are given.
+    anything that isn't a unit code (ATAR, "equivalent", course enrolment, ...)
+    is left out, same as the old prereqlist.
+
+    for checking lots of units quickly, PrereqBits compiles every unit of a
+    catalog against one CodeTable (unit code -> bit number), so a set of
+    completed units is one int and a check is a few bitwise ands.
+"""
+
+import re
+import sys
+from itertools import product
+
+import instrument
+
+TOKENS = re.compile(r'\b[a-zA-Z]{4}\d{4}\b|\band\b|\bor\b|[()]')
+
+
+def tokenise(text) -> list:
+    """ returns the codes, "and", "or" and brackets in text, tidied up so that
+        runs of operators become one ("and" if there's an "and" in the run),
+        operators with nothing to join are dropped, codes written next to each
+        other (a list of units) are joined with "or" and empty or unmatched
+        closing brackets are dropped.
+    """
+    tokens = []
+    pending = None      # operator waiting for its right hand side
+    depth = 0
+    for token in TOKENS.findall(text):
+        token = token.strip()
+        if token in ("and", "or"):
+            if len(tokens) > 0 and tokens[-1] != "(":
+                pending = "and" if "and" in (pending, token) else token
+        elif token == ")":
+            if depth == 0:
+                continue
+            depth -= 1
+            pending = None
+            if tokens[-1] == "(":
+                tokens.pop()
+                if len(tokens) > 0 and tokens[-1] in ("and", "or"):
+                    pending = tokens.pop()
+            else:
+                tokens.append(token)
+        else:
+            if len(tokens) > 0 and tokens[-1] != "(":
+                tokens.append(pending or "or")
+            pending = None
+            tokens.append(sys.intern(token))
+            if token == "(":
+                depth += 1
+    return tokens
+
+
+def parse(text):
+    """returns the expression for the prerequisite text (not simplified)"""
+    tokens = tokenise(text)
+    pos = 0
+
+    def and_expr():
+        nonlocal pos
+        terms = [or_expr()]
+        while pos < len(tokens) and tokens[pos] == "and":
+            pos += 1
+            terms.append(or_expr())
+        return join("and", terms)
+
+    def or_expr():
+        nonlocal pos
+        terms = [atom()]
+        while pos < len(tokens) and tokens[pos] == "or":
+            pos += 1
+            terms.append(atom())
+        return join("or", terms)
+
+    def atom():
+        nonlocal pos
+        if pos >= len(tokens):
+            return None
+        token = tokens[pos]
+        pos += 1
+        if token == "(":
+            inner = and_expr()
+            if pos < len(tokens) and tokens[pos] == ")":
+                pos += 1
+            return inner
+        if token == ")":    # only after a bracket that was never closed
+            pos -= 1
+            return None
+        return token
+
+    return and_expr()
+
+
+def join(op, terms):
+    """makes an op node out of terms, leaving out the empty ones"""
+    terms = [term for term in terms if term is not None]
+    if len(terms) == 0:
+        return None
+    if len(terms) == 1:
+        return terms[0]
+    return (op,) + tuple(terms)
+
+
+def simplify(expr):
+    """ flattens nested nodes of the same kind, removes repeats and applies
+        absorption (A and (A or B) is A, A or (A and B) is A).
+    """
+    if expr is None or isinstance(expr, str):
+        return expr
+    op = expr[0]
+    terms = []
+    for term in expr[1:]:
+        term = simplify(term)
+        if isinstance(term, tuple) and term[0] == op:
+            terms.extend(term[1:])
+        elif term is not None:
+            terms.append(term)
+    terms = list(dict.fromkeys(terms))
+    direct = set(terms)
+    terms = [term for term in terms
+             if not (isinstance(term, tuple) and any(t in direct for t in term[1:]))]
+    return join(op, terms)
+
+
+def from_text(text):
+    """parse and simplify the prerequisite text"""
+    return simplify(parse(text))
+
+
+def intern(expr):
+    """the same expression with every unit code interned, so units share them"""
+    if expr is None:
+        return None
+    if isinstance(expr, str):
+        return sys.intern(expr)
+    return (expr[0],) + tuple(intern(term) for term in expr[1:])
+
+
+def evaluate(expr, completed) -> bool:
+    """True if the completed units satisfy the expression"""
+    if expr is None:
+        return True
+    if isinstance(expr, str):
+        return expr in completed
+    want = expr[0] == "or"      # an "or" stops at the first true term, an "and" at the first false
+    for term in expr[1:]:
+        if (term in completed if isinstance(term, str) else evaluate(term, completed)) == want:
+            return want
+    return not want
+
+
+def remaining(expr, completed):
+    """the part of the expression that still isn't satisfied (None if it all is)"""
+    if expr is None or evaluate(expr, completed):
+        return None
+    if isinstance(expr, str) or expr[0] == "or":
+        return expr
+    return join("and", [remaining(term, completed) for term in expr[1:]])
+
+
+def codes(expr) -> set:
+    """every unit code mentioned in the expression"""
+    if expr is None:
+        return set()
+    if isinstance(expr, str):
+        return {expr}
+    return set().union(*(codes(term) for term in expr[1:]))
+
+
+def to_text(expr) -> str:
+    """the expression written out with brackets"""
+    if expr is None:
+        return ""
+    if isinstance(expr, str):
+        return expr
+    terms = [to_text(t) if isinstance(t, str) else f"({to_text(t)})" for t in expr[1:]]
+    return f" {expr[0]} ".join(terms)
+
+
+def to_dnf(expr) -> list:
+    """ the old prereqlist: a list of alternatives, each a list of codes that all
+        need to be completed. this can get big, only use it when you need the lists.
+    """
+    if expr is None:
+        return []
+    if isinstance(expr, str):
+        return [[expr]]
+    if expr[0] == "or":
+        result = []
+        for term in expr[1:]:
+            result.extend(to_dnf(term))
+    else:
+        result = [sum(terms, []) for terms in product(*(to_dnf(term) for term in expr[1:]))]
+    unique = {}
+    for terms in result:
+        terms = list(dict.fromkeys(terms))
+        unique.setdefault(tuple(terms), terms)
+    return list(unique.values())
+
+
+def from_dnf(prereqlist):
+    """turns an old style prereqlist back into an expression"""
+    return simplify(join("or", [join("and", list(terms)) for terms in prereqlist]))
+
+
+class CodeTable:
+    """ interns unit codes as small integers so a set of units can be kept as
+        the bits of one int (bit i set means code i is in the set).
+    """
+    def __init__(self, codes=()) -> None:
+        self.index = {}
+        self.codes = []
+        for code in codes:
+            self.intern(code)
+
+    def intern(self, code) -> int:
+        """returns the bit number for code, giving it the next free one if it's new"""
+        if code not in self.index:
+            self.index[code] = len(self.codes)
+            self.codes.append(code)
+        return self.index[code]
+
+    def bit(self, code) -> int:
+        return 1 << self.intern(code)
+
+    def mask(self, codes) -> int:
+        """the bitmask of a set of codes"""
+        mask = 0
+        for code in codes:
+            mask |= 1 << self.intern(code)
+        return mask
+
+    def decode(self, mask) -> list:
+        """the codes in a bitmask, by walking its set bits (lowest first)"""
+        codes = []
+        while mask:
+            low = mask & -mask
+            codes.append(self.codes[low.bit_length() - 1])
+            mask ^= low
+        return codes
+
+
+class BitPrereq:
+    """ an expression compiled against a CodeTable.
+        satisfied when every bit of required is completed, every mask in any_of
+        has at least one completed bit, and every entry of nested (for an "or"
+        with "and"s inside it) is met. a nested entry is a mask (any one of these
+        bits will do) and the other alternatives: ints are a set of bits that
+        all have to be completed, BitPrereqs anything more complicated.
+    """
+    __slots__ = ("required", "any_of", "nested")
+
+    def __init__(self, expr, table) -> None:
+        self.required = 0
+        any_of = []
+        nested = []
+        terms = [] if expr is None else [expr] if isinstance(expr, str) or expr[0] == "or" else expr[1:]
+        for term in terms:
+            if isinstance(term, str):
+                self.required |= table.bit(term)
+                continue
+            mask = 0
+            alts = []
+            for t in term[1:]:
+                if isinstance(t, str):
+                    mask |= table.bit(t)
+                elif all(isinstance(code, str) for code in t[1:]):
+                    alts.append(table.mask(t[1:]))
+                else:
+                    alts.append(BitPrereq(t, table))
+            if len(alts) == 0:
+                any_of.append(mask)
+            else:
+                nested.append((mask, tuple(alts)))
+        self.any_of = tuple(any_of)
+        self.nested = tuple(nested)
+
+    def check(self, completed) -> bool:
+        """True if the completed bitmask satisfies this prerequisite"""
+        if completed & self.required != self.required:
+            return False
+        for mask in self.any_of:
+            if not completed & mask:
+                return False
+        for mask, alts in self.nested:
+            if completed & mask:
+                continue
+            for alt in alts:
+                if completed & alt == alt if isinstance(alt, int) else alt.check(completed):
+                    break
+            else:
+                return False
+        return True
+
+
+class PrereqBits:
+    """ prerequisites of a whole catalog compiled to bitmasks.
+        units is a {name: Unit} dictionary (e.g. UnitList.units or the catalog).
+    """
+    def __init__(self, units, table=None) -> None:
+        self.table = CodeTable() if table is None else table
+        self.prereqs = {}
+        for name, unit in units.items():
+            if unit is not None:
+                self.add(name, unit)
+
+    def add(self, name, unit) -> None:
+        """(re)compile one unit"""
+        self.table.intern(name[:8])
+        self.prereqs[name] = BitPrereq(unit.get_prereq_expr(), self.table)
+
+    def completed(self, codes) -> int:
+        """the bitmask for a set of completed unit codes"""
+        return self.table.mask(codes)
+
+    def is_unlocked(self, name, completed) -> bool:
+        """True if unit name can be taken once the completed bitmask is done"""
+        instrument.count("prereq.checks")
+        return self.prereqs[name].check(completed)
+
+    def unlocked(self, completed, names=None) -> list:
+        """the units (of names, or all) whose prerequisites the completed bitmask meets"""
+        names = self.prereqs if names is None else names
+        instrument.count("prereq.checks", len(names))
+        return [name for name in names if self.prereqs[name].check(completed)]
@@ -0,0 +1,196 @@
+"""
+    the prerequisite graph of a catalog.
+    an edge goes from a unit to each unit that lists it as a prerequisite.
+    the full prerequisite chain and everything a unit eventually unlocks are
+    worked out once and kept as bitmasks (see prereq.CodeTable), so questions
+    like "does CITS4404 need CITS1401 somewhere down the line" are one lookup.
+
+        graph = PrereqGraph(STORE.load_units())
+        graph.chain("CITS4404")         # every unit needed before it
+        graph.unlocks("CITS2200")       # every unit it leads to
+        UNIT_HOOKS.append(graph.update_unit)   # keep it up to date as units are saved
+
+    nodes are unit codes (the name without the year), so build one graph per
+    handbook year if units from several years are loaded: the edges of every name
+    are kept apart and a node has those of all its names (CITS2200 and CITS2200 2024),
+    however the names are added or changed. a hand-made copy (CITS1003b) is a node
+    of its own.
+"""
+
+import prereq
+
+
+class PrereqGraph:
+    def __init__(self, units=None) -> None:
+        self.table = prereq.CodeTable()
+        self.requires = {}      # code -> set of codes listed in its prerequisites
+        self.required_by = {}   # code -> set of codes that list it
+        self.listed = {}        # unit name -> set of codes in its prerequisites
+        self.names = {}         # code -> set of unit names with that code
+        self.ancestors = {}     # code -> bitmask of the whole prerequisite chain
+        self.descendants = {}   # code -> bitmask of everything it eventually unlocks
+        self.depth = {}         # code -> length of the longest prerequisite chain below it
+        self.cycles = []        # groups of codes that (indirectly) require each other
+        self.lists = {}         # code -> (chain, unlocks) decoded, dropped when close changes them
+        if units is not None:
+            self.build(units)
+
+    def node(self, code) -> str:
+        code = code.split()[0]
+        if code not in self.requires:
+            self.table.intern(code)
+            self.requires[code] = set()
+            self.required_by[code] = set()
+            self.ancestors[code] = 0
+            self.descendants[code] = 0
+            self.depth[code] = 0
+        return code
+
+    def set_prereqs(self, code, prereqs) -> None:
+        """replace the direct prerequisites of code (edges only)"""
+        code = self.node(code)
+        for p in self.requires[code]:
+            self.required_by[p].discard(code)
+        self.requires[code] = {self.node(p) for p in prereqs} - {code}
+        for p in self.requires[code]:
+            self.required_by[p].add(code)
+
+    def set_unit(self, name, unit) -> str:
+        """ sets the prerequisites of one unit name (or removes it if unit is None)
+            and gives its node those of every name it has (edges only), returns the node
+        """
+        code = self.node(name)
+        names = self.names.setdefault(code, set())
+        if unit is None:
+            self.listed.pop(name, None)
+            names.discard(name)
+        else:
+            self.listed[name] = prereq.codes(unit.get_prereq_expr())
+            names.add(name)
+        self.set_prereqs(code, set().union(*(self.listed[n] for n in names)))
+        return code
+
+    def build(self, units) -> None:
+        """builds the whole graph from a {name: Unit} dictionary"""
+        for name, unit in units.items():
+            if unit is not None:
+                self.set_unit(name, unit)
+        self.close(list(self.requires))
+
+    def close(self, codes) -> None:
+        """ recomputes ancestors, descendants and depth for codes, which must
+            include every node whose values could have changed.
+        """
+        nodes = set(codes)
+        for code in nodes:
+            self.lists.pop(code, None)
+        order, cycles = self.order(nodes)
+        self.cycles = [c for c in self.cycles if not set(c) & nodes] + cycles
+        for group in order:                 # prerequisites come before the units needing them
+            anc = 0
+            depth = 0
+            for code in group:
+                for p in self.requires[code]:
+                    if p not in group:
+                        anc |= self.ancestors[p] | self.table.bit(p)
+                        depth = max(depth, self.depth[p] + 1)
+            if len(group) > 1:              # a cycle, everyone in it needs everyone else
+                anc |= self.table.mask(group)
+            for code in group:
+                self.ancestors[code] = anc
+                self.depth[code] = depth
+        for group in reversed(order):
+            desc = self.table.mask(group) if len(group) > 1 else 0
+            for code in group:
+                for d in self.required_by[code]:
+                    if d not in group:
+                        desc |= self.descendants[d] | self.table.bit(d)
+            for code in group:
+                self.descendants[code] = desc
+
+    def order(self, nodes):
+        """ topological order of nodes (strongly connected groups, prerequisites first)
+            using Tarjan's algorithm, plus the groups that are cycles.
+        """
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        groups = []
+        counter = 0
+
+        def visit(v):
+            nonlocal counter
+            index[v] = low[v] = counter
+            counter += 1
+            stack.append(v)
+            on_stack.add(v)
+            for w in self.requires[v]:
+                if w not in nodes:
+                    continue
+                if w not in index:
+                    visit(w)
+                    low[v] = min(low[v], low[w])
+                elif w in on_stack:
+                    low[v] = min(low[v], index[w])
+            if low[v] == index[v]:
+                group = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    group.append(w)
+                    if w == v:
+                        break
+                groups.append(tuple(sorted(group)))
+
+        for v in sorted(nodes):
+            if v not in index:
+                visit(v)
+        return groups, [list(group) for group in groups if len(group) > 1]
+
+    def update_unit(self, name, unit) -> None:
+        """ updates the graph after one unit changed (or was deleted if unit is None).
+            only the unit, its old and new prerequisite chains and what it unlocks
+            are recomputed, nothing else can change.
+        """
+        code = self.node(name)
+        chains = self.ancestors[code]
+        self.set_unit(name, unit)
+        for p in self.requires[code]:
+            chains |= self.ancestors[p] | self.table.bit(p)
+        self.close({code} | set(self.table.decode(chains | self.descendants[code])))
+
+    def prerequisites(self, code) -> list:
+        """direct prerequisites"""
+        return sorted(self.requires.get(code.split()[0], ()))
+
+    def dependents(self, code) -> list:
+        """units that list code as a direct prerequisite"""
+        return sorted(self.required_by.get(code.split()[0], ()))
+
+    def decoded(self, code) -> tuple:
+        """(chain, unlocks) of code, decoded once until it changes"""
+        code = code.split()[0]
+        if code not in self.requires:
+            return [], []
+        if code not in self.lists:
+            self.lists[code] = (self.table.decode(self.ancestors[code]),
+                                self.table.decode(self.descendants[code]))
+        return self.lists[code]
+
+    def chain(self, code) -> list:
+        """every unit in the prerequisite chain of code"""
+        return list(self.decoded(code)[0])
+
+    def unlocks(self, code) -> list:
+        """every unit code eventually leads to"""
+        return list(self.decoded(code)[1])
+
+    def needs(self, code, other) -> bool:
+        """True if other is somewhere in the prerequisite chain of code"""
+        other = other.split()[0]
+        return other in self.table.index and bool(self.ancestors.get(code.split()[0], 0) & self.table.bit(other))
+
+    def level(self, code) -> int:
+        """length of the longest prerequisite chain below code (0 if it has none)"""
+        return self.depth.get(code.split()[0], 0)
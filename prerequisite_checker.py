@@ -4,53 +4,134 @@
     date       : 15 March 2023
 """
 
-import copy
-import requests
-from bs4 import BeautifulSoup
-import pickle
 import pathlib
 import re
-from itertools import product
 import sys
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import handbook
+import catalog
+import extract
+import instrument
+import normalise
+import prereq as prereq_expr
+import scheduler
+import structure
 
 # UNIT_PATH = "./uwa-study-planner/units/"
 # COURSE_PATH = "./uwa-study-planner/courses/"
 UNIT_PATH = "./units/"
 COURSE_PATH = "./courses/"
+CATALOG_PATH = "./catalog.db"     # all units and courses live here, units/ and courses/ are the old format
 HONOURS = ["CITS4010", "CITS4011"]
+# functions called with (name, unit) whenever a unit is saved, or (name, None) when it's deleted.
+# e.g. UNIT_HOOKS.append(PrereqGraph(...).update_unit) keeps a graph up to date.
+UNIT_HOOKS = []
+# the same for courses, called with (name, course) when a course is saved, and with
+# (name, course, False) when its units are changed but it isn't saved yet (add_unitlist,
+# remove_unitlist). e.g. usage.UsageIndex.update_course
+COURSE_HOOKS = []
+# functions called with no arguments once a save is done, after the hooks above have had
+# every unit (or the course) of it, so a bulk refresh is one call. e.g. usage.UsageIndex.save
+SAVE_HOOKS = []
+# shared copies of values lots of units have, see shared()
+SHARED = {}
+
+# lines in the unit page that start a section, matched exactly
+HEADINGS = ("UWA Handbook 2023", "Description", "Outcomes", "Unit Coordinator(s)",
+            "Prerequisites", "Incompatibility")
+# lines that start a section but carry their value on the same line
+PREFIXES = ("Credit", "Offering", "Details for undergraduate", "Assessment")
+
+
+def page_lines(html) -> list:
+    """the non-empty lines of the unit details on a handbook unit page (see extract.py)"""
+    started = instrument.start()
+    lines = extract.unit_lines(html)
+    instrument.stop("parse.html", started)
+    instrument.count("parse.pages")
+    return lines
+
+
+def index_sections(text) -> dict:
+    """ walks the page lines once and returns a map of heading -> list of line offsets
+        for every heading in HEADINGS and PREFIXES that shows up.
+    """
+    index = {}
+    for i, line in enumerate(text):
+        if line in HEADINGS:
+            index.setdefault(line, []).append(i)
+        elif line.startswith(PREFIXES):
+            for prefix in PREFIXES:
+                if line.startswith(prefix):
+                    index.setdefault(prefix, []).append(i)
+                    break
+    return index
+
+
+def tidy(line, rules, fired=None) -> str:
+    """ a prerequisite or incompatibility line with single spaces around "and" and
+        "or" and the rule set applied (see normalise.py)
+    """
+    line = " or ".join(row.strip() for row in line.split("or "))
+    line = " and ".join(row.strip() for row in line.split("and "))
+    return normalise.normalise(rules, line, fired)
+
+
+def saved() -> None:
+    """calls SAVE_HOOKS, once the units or course of a save went through their hooks"""
+    for hook in SAVE_HOOKS:
+        hook()
+
+
+def shared(value):
+    """ the one shared copy of an immutable value (offer rows, semester sets, ...),
+        so units don't each keep their own. strings are interned.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return SHARED.setdefault(value, value)
+
 
 class Unit:
     URL = "https://handbooks.uwa.edu.au/unitdetails?code="
     PREREQ = "./prereq_list.txt"
-    
+    # no per unit __dict__, an attribute that was never set is missing (hasattr is False)
+    __slots__ = ("code", "text", "title", "description", "credit", "offering", "offer", "semester",
+                 "ugdetails", "outcomes", "coordinator", "prereq", "prereq_expr", "incompatibility",
+                 "text_hash")
+
     def __init__(self, ucode="", text=[], get_text=True) -> None:
-        self.code = ucode
+        self.code = shared(ucode)
         if get_text:
             text = self.get_text()
             if text == []:
                 #print("There was no text data provided, check your url...")
                 return
         self.text = text
-        self.title = text[text.index("UWA Handbook 2023") + 1]
+        started = instrument.start()
+        index = index_sections(text)
+
+        def first(heading):
+            """offset of the first line with this heading"""
+            if heading not in index:
+                raise ValueError(f"{heading} is not in the unit page")
+            return index[heading][0]
+
+        self.title = text[first("UWA Handbook 2023") + 1]
 
-        self.description = ""
-        i = text.index("Description") + 1
-        j = [text.index(j) for j in text if j.startswith("Credit")][0]
-        for k in range(i, j):
-            self.description += text[k].strip() + "\n"
+        i = first("Description") + 1
+        j = first("Credit")
+        self.description = "".join(line.strip() + "\n" for line in text[i:j])
         
         self.credit = int(text[j].strip("Credit").strip("points").strip())
         
-        self.offering = "NA"
-        i = [text.index(j) for j in text if j.startswith("Offering")][0]
-        
-        try:
-            j = [text.index(j) for j in text if j.startswith("Details for undergraduate courses")][0]
-        except:
-            j = text.index("Outcomes")
-
-        for k in range(i, j):
-            self.offering += text[k]
+        offering = first("Offering")
+        outcomes = first("Outcomes")
+        ugdetails = [k for k in index.get("Details for undergraduate", [])
+                     if text[k].startswith("Details for undergraduate courses")]
+        j = ugdetails[0] if len(ugdetails) > 0 else outcomes
+        self.offering = "NA" + "".join(text[offering:j])
         rows = self.offering.split("Semester")
 
         self.offer = []
@@ -109,74 +190,38 @@ class Unit:
 
 
         self.ugdetails = "Check the handbook"
-        i = [text.index(j) for j in text if j.startswith("Offering")][0]
-        j = text.index("Outcomes")
-        while not text[i].startswith("Details for undergraduate") and i < j:
-            i += 1
-        if text[i].startswith("Details for undergraduate"):
-            text[i] = text[i].replace("Details for undergraduate courses", "")
-
-            self.ugdetails = ""
-            for k in range(i, j):
-                self.ugdetails += text[k].replace("Level ", " Level ").strip() + "\n"
+        i = [k for k in index.get("Details for undergraduate", []) if offering <= k < outcomes]
+        if len(i) > 0:
+            lines = [text[i[0]].replace("Details for undergraduate courses", "")] + text[i[0] + 1:outcomes]
+            self.ugdetails = "".join(line.replace("Level ", " Level ").strip() + "\n" for line in lines)
         self.ugdetails = self.ugdetails.strip()
 
-        self.outcomes = ""
-        i = text.index("Outcomes") + 1
-        j = [text.index(j) for j in text if j.startswith("Assessment")][0]
-        for k in range(i, j):
-            self.outcomes += text[k] + "\n"
+        i = outcomes + 1
+        j = first("Assessment")
+        self.outcomes = "".join(line + "\n" for line in text[i:j])
 
         try:
-            self.coordinator = text[text.index("Unit Coordinator(s)") + 1]
+            self.coordinator = text[first("Unit Coordinator(s)") + 1]
         except:
             print(f"No coordinator in this unit: {self.code}")
             self.coordinator = ""
         try:
-            prereq = text[text.index("Prerequisites") + 1].split("or ")
-            prereq = " or ".join([row.strip() for row in prereq]).split("and ")
-            prereq = " and ".join([row.strip() for row in prereq])
-            prereq = prereq.replace("Enrolment in", "Enrolment in ")
-            prereq = prereq.replace("Programming and System", "Programming & System")
-            prereq = prereq.replace("FoundationsandCITS1401", "Foundations and CITS1401")
-            prereq = prereq.replace("Java andM", "Java and M")
-            prereq = prereq.replace("Bachel or", "Bachelor")
-            prereq = prereq.replace(" in   in the", " in the ")
-            prereq = prereq.replace("specialisationorthe", "specialisation or the")
-            prereq = prereq.replace("IntelligenceorBachelor", "Intelligence or Bachelor")
-            prereq = prereq.replace("in in", "in")
-            prereq = prereq.replace("the the", "the")
-            prereq = prereq.replace(" inthe ", " in the ")
-            prereq = prereq.replace("Scienceorthe", "Science or the")
-            prereq = prereq.replace(" maj or ", " major")
-            prereq = prereq.replace("majorand", "major and")
-            prereq = prereq.replace("pri or", "prior")
-            prereq = prereq.replace(" including", " including ")
-            prereq = prereq.replace("of96", "of 96")
-            prereq = prereq.replace("  ", " ")
-            if " f or " in prereq:
-                prereq = prereq.replace(" f or ", " for ")
-            self.prereq = prereq
+            self.prereq = tidy(text[first("Prerequisites") + 1], "prereq")
         except:
             print(f"No prerequisites in this unit: {self.code}")
             self.prereq = ""
         
-        self.prereqlist = []
         self.update_prereqlist()
 
 
         try:
-            incomp = text[text.index("Incompatibility") + 1].split("or ")
-            incomp = " or ".join([row.strip() for row in incomp]).split("and ")
-            incomp = " and ".join([row.strip() for row in incomp])
-            if " f or " in incomp:
-                incomp = incomp.replace(" f or ", " for ")
-            incomp = incomp.replace("Enrolment in", "Enrolment in ")
-            incomp = incomp.replace("FoundationsandCITS1401", "Foundations and CITS1401")
-            self.incompatibility = incomp
+            self.incompatibility = tidy(text[first("Incompatibility") + 1], "incompatibility")
         except:
             print(f"No incompatibility in this unit: {self.code}")
             self.incompatibility = ""
+        self.share()
+        instrument.stop("parse.sections", started)
+        instrument.count("parse.units")
 
     def __str__(self):
         offer = f"\n{'':22}".join([f"{i} | {j:12} | {k}" for (i, j, k) in self.offer])
@@ -196,51 +241,81 @@ class Unit:
                 )
 
 
+    def __getstate__(self) -> dict:
+        """the attributes that are set, as a dict (for pickle, copy and the catalog)"""
+        return {name: getattr(self, name) for name in Unit.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state) -> None:
+        """ sets the attributes from a saved attribute dict, old pickles included.
+            a saved prereqlist (units from before prerequisite expressions) becomes the
+            expression, anything else that isn't a Unit attribute any more is dropped.
+        """
+        if "prereq_expr" not in state and "prereqlist" in state:
+            state = dict(state, prereq_expr=prereq_expr.from_dnf(state["prereqlist"]))
+        for name in Unit.__slots__:
+            if name in state:
+                setattr(self, name, state[name])
+        self.share()
+
+    def share(self) -> None:
+        """swaps codes, offer rows, semesters and prerequisite codes for shared copies"""
+        if hasattr(self, "code"):
+            self.code = shared(self.code)
+        if hasattr(self, "offer") and not isinstance(self.offer, str):
+            self.offer = shared(tuple(shared(tuple(shared(s) for s in row)) for row in self.offer))
+        if hasattr(self, "semester"):
+            self.semester = shared(frozenset(self.semester))
+        if hasattr(self, "prereq_expr"):
+            self.prereq_expr = prereq_expr.intern(self.prereq_expr)
+
     def update_values(self):
         """call all the update functions when saving unit"""
         self.update_prereqlist()
 
-    def update_prereqlist(self) -> None:
+    def update_prereqlist(self, fired=None) -> None:
         """update the prereq list in case modified"""
-        # do some prep work
-        if "Data Structures and Algorithms" in self.prereq:
-            self.prereq = self.prereq.replace("Data Structures and Algorithms",
-                                "Data Structures & Algorithms")
-        if "Theory and Methods" in self.prereq:
-            self.prereq = self.prereq.replace("Theory and Methods",
-                                "Theory & Methods")
-        if "Analysis and Visualisation" in self.prereq:
-            self.prereq = self.prereq.replace("Analysis and Visualisation",
-                                "Analysis & Visualisation")
-        if "Intelligence and Adaptive" in self.prereq:
-            self.prereq = self.prereq.replace("Intelligence and Adaptive",
-                                "Intelligence & Adaptive")  
-        if "Mobile and Wireless" in self.prereq:
-            self.prereq = self.prereq.replace("Mobile and Wireless",
-                                "Mobile & Wireless")  
-        if "Tools and Scripting" in self.prereq:
-             self.prereq = self.prereq.replace("Tools and Scripting",
-                                "Tools & Scripting")  
-        if "Testing and Quality" in self.prereq:
-             self.prereq = self.prereq.replace("Testing and Quality",
-                                "Testing & Quality")  
-        if "6 points of programming" in self.prereq:
-            self.prereq = self.prereq.replace("6 points of programming",
-                                "CITS1401 or CITX1401")
-        elif "12 points of programming" in self.prereq:
-            self.prereq = self.prereq.replace("12 points of programming",
-                                "CITS2002 or CITS2005")
-
-        #list of all unit codes in prereq and "or" and "and"
-        matches = "".join(self.match_code(self.prereq)).strip("andor ")
-        #print("MATCHES", matches)
-        and_groups = [code for code in matches.split(' and ') if code.strip("andor ")]
-        # Split each 'and' group by 'or' separator
-        or_groups = [[code for code in group.split(' or ') if code.strip("andor ")] 
-                     for group in and_groups]
-
-        # Generate all possible combinations of subjects
-        self.prereqlist = [list(pair) for pair in list(product(*or_groups)) if pair]        
+        # unit names with "and" in them, "6 points of programming", ... (see normalise.py)
+        self.prereq = normalise.normalise("names", self.prereq, fired)
+
+        #compile the unit codes, "and", "or" and brackets into an and/or tree
+        self.prereq_expr = prereq_expr.from_text(self.prereq)
+
+    def renormalise(self, fired=None) -> None:
+        """ prereq and incompatibility made again from the page text with the current
+            normalisation rules (units without page text only get the "names" rules).
+        """
+        text = getattr(self, "text", None)
+        if text:
+            index = index_sections(text)
+            for name, heading in (("prereq", "Prerequisites"), ("incompatibility", "Incompatibility")):
+                if heading in index and index[heading][0] + 1 < len(text):
+                    setattr(self, name, tidy(text[index[heading][0] + 1], name, fired))
+        self.update_prereqlist(fired)
+
+    def get_prereq_expr(self):
+        """ the prerequisite expression (see prereq.py).
+            units saved before there were expressions get theirs from the saved
+            prereqlist (see __setstate__), so hand edited lists are kept.
+        """
+        if not hasattr(self, "prereq_expr"):
+            self.update_prereqlist()
+        return self.prereq_expr
+
+    @property
+    def prereqlist(self) -> list:
+        """every combination of units that satisfies the prerequisites, worked out
+           from the expression when asked for. prefer is_unlocked for checking.
+        """
+        return prereq_expr.to_dnf(self.get_prereq_expr())
+
+    @prereqlist.setter
+    def prereqlist(self, value) -> None:
+        self.prereq_expr = prereq_expr.from_dnf(value)
+
+    def is_unlocked(self, completed) -> bool:
+        """True if the completed units satisfy the prerequisites of this unit"""
+        instrument.count("prereq.checks")
+        return prereq_expr.evaluate(self.get_prereq_expr(), completed)
 
     def match_code(self, text):
         pattern = r'\b[a-zA-Z]{4}\d{4}\b|\b and \b|\b or \b'
@@ -248,19 +323,23 @@ class Unit:
         return matches  
 
     def save(self, fname="", update=True):
-        """saves the unit file"""
+        """saves the unit into the catalog"""
         if update:
             self.update_values()
         fname = self.code if fname == "" else fname
-        with open(UNIT_PATH + fname, 'wb') as f:
-            pickle.dump(self, f)
+        STORE.put_unit(self, fname)
+        for hook in UNIT_HOOKS:
+            hook(fname, self)
+        saved()
     
 
     def load(self, code):
-        """returns the saved unit file"""
+        """returns the saved unit from the catalog (or an old unit file)"""
+        unit = STORE.get_unit(code)
+        if unit is not None:
+            return unit
         try:
-            with open(UNIT_PATH + code, 'rb') as f:
-                return pickle.load(f)
+            return catalog.load_pickle(UNIT_PATH + code)
         except FileNotFoundError:
             print(f"UnitClassError: file {code} doesn't exist... I'll get it from the handbook and make it...")
             try:
@@ -273,10 +352,18 @@ class Unit:
                 print(f"Could not create unit: {code}")
 
 
+    def content_hash(self) -> str:
+        """ hash of the page text the unit was parsed from, to tell if the handbook changed.
+            units loaded without their text have the hash saved with them.
+        """
+        if hasattr(self, "text") or not hasattr(self, "text_hash"):
+            return catalog.text_hash(getattr(self, "text", []))
+        return self.text_hash
+
     def update(self):
         """updates the content with a fresh pull from the handbook"""
         try:
-            text = self.get_text()
+            text = self.get_text(max_age=0)
             unit = Unit(self.code, text, False)
             unit.save()
             return unit
@@ -285,27 +372,95 @@ class Unit:
     
     def delete(self):
         """checks the handbook online and deletes the unit file if not in the handbook"""
-        if requests.get(Unit.URL + self.code).status_code != 200:
-            pathlib.Path(UNIT_PATH + self.code).unlink()
-
-    def get_text(self):
-        """returns the text from the web"""
+        if len(handbook.missing([self.code], Unit.URL, workers=1)) > 0:
+            STORE.delete_units([self.code])
+            pathlib.Path(UNIT_PATH + self.code).unlink(missing_ok=True)
+            for hook in UNIT_HOOKS:
+                hook(self.code, None)
+            saved()
+
+    def get_text(self, max_age=None):
+        """returns the text from the web (or the handbook page cache if it's recent enough)"""
         if len(self.code) > 0:
-            response = requests.get(Unit.URL + self.code)
+            response = handbook.fetch(Unit.URL + self.code, max_age)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
-                return [s.strip() for s in soup.get_text().splitlines() if s.strip()]
+                return page_lines(response.text)
             else:
                 print(f"the url for unit, {self.code}, doesn't exist... try again...")
         return []
 
 
+class LazyUnits(MutableMapping):
+    """ dictionary of code:Unit that only loads a unit the first time it's asked for.
+        at most max_units loaded units are kept, the least recently used one is
+        dropped (and loaded again if it's needed later). units put in directly
+        (e.g. new ones found in the handbook) are never dropped.
+    """
+    def __init__(self, codes, load, max_units=None) -> None:
+        self.codes = dict.fromkeys(codes)   # every code in the list, in order
+        self.load = load
+        self.max_units = max_units
+        self.loaded = OrderedDict()
+        self.added = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, code):
+        if code in self.added:
+            return self.added[code]
+        if code in self.loaded:
+            self.hits += 1
+            self.loaded.move_to_end(code)
+            return self.loaded[code]
+        if code not in self.codes:
+            raise KeyError(code)
+        self.misses += 1
+        unit = self.load(code)
+        self.loaded[code] = unit
+        if self.max_units is not None and len(self.loaded) > self.max_units:
+            self.loaded.popitem(last=False)
+            self.evictions += 1
+        return unit
+
+    def __setitem__(self, code, unit):
+        self.codes[code] = None
+        self.loaded.pop(code, None)
+        self.added[code] = unit
+
+    def __delitem__(self, code):
+        del self.codes[code]
+        self.loaded.pop(code, None)
+        self.added.pop(code, None)
+
+    def __contains__(self, code):
+        return code in self.codes
+
+    def __iter__(self):
+        return iter(list(self.codes))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def stats(self) -> dict:
+        """counters for how well the cache is doing"""
+        return {"units": len(self.codes), "resident": len(self.loaded) + len(self.added),
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
 class UnitList:
     URL = 'https://handbooks.uwa.edu.au/unitdetails?code='
+    lazy = False
+    max_units = None
 
-    def __init__(self, fname="", ulist=[]) -> None:
+    def __init__(self, fname="", ulist=[], lazy=False, max_units=None) -> None:
+        """ with lazy=True units are loaded when first used instead of all up front,
+            and max_units caps how many stay loaded at once.
+        """
         self.fname = fname
         self.ulist = ulist
+        self.lazy = lazy
+        self.max_units = max_units
         self.units = self.get_unit_list() #this is a dictionary of code:Unit
         
     def __contains__(self, code):
@@ -322,9 +477,13 @@ class UnitList:
         return self.units[code]
 
     def get_unit_list_helper(self, codes):
-        """get units helper"""
+        """get units helper, the ones in the catalog come from a single read"""
+        stored = STORE.load_units(codes)
         units = {}
         for code in codes:
+            if code in stored:
+                units[code] = stored[code]
+                continue
             success = False
             try:
                 if type(code) == str:
@@ -341,19 +500,43 @@ class UnitList:
         return units
 
 
-    def get_unit_list(self):
-        """returns the list of unit code"""
+    def get_codes(self) -> list:
+        """returns the unit codes from the file fname, or ulist if there is no file"""
         if len(self.fname) > 0:
             try:
                 with open(self.fname) as f:
-                    codes = [code.strip() for code in f.readlines()]
-                    return self.get_unit_list_helper(codes)
+                    return [code.strip() for code in f.readlines()]
             except:
                 print(f"the unit list: {self.fname}, doesn't exist... try making it...")
         elif len(self.ulist) > 0:
-            return self.get_unit_list_helper(self.ulist)
+            return list(self.ulist)
+        return []
+
+    def get_unit_list(self):
+        """returns the dictionary of code:Unit"""
+        codes = self.get_codes()
+        if self.lazy:
+            return LazyUnits(codes, self.load_unit, self.max_units)
+        if len(codes) > 0:
+            return self.get_unit_list_helper(codes)
         return {}
 
+    def load_unit(self, code):
+        """ loads a single unit (None if it can't be made). a saved one is one read
+            of its record, not of the whole catalog.
+        """
+        unit = STORE.get_unit(code)
+        if unit is not None:
+            return unit
+        return self.get_unit_list_helper([code]).get(code)
+
+    def stats(self) -> dict:
+        """hit/miss/eviction counters of a lazy unit list"""
+        if isinstance(self.units, LazyUnits):
+            return self.units.stats()
+        return {"units": len(self.units), "resident": len(self.units),
+                "hits": 0, "misses": 0, "evictions": 0}
+
 
     def update_unit_list(self, unit) -> None:
         """updates the unit list if missing"""
@@ -381,18 +564,97 @@ class UnitList:
         with open(fname, "w") as f:
             f.write(output)
 
-    def remove_none_units(self) -> None:
-        """go through the unit list and remove if not found in the handbook online"""
-        codes = set([code for code in self.units
-                        if requests.get(UnitList.URL + code).status_code != 200])
+    def remove_none_units(self, workers=handbook.CHECK_WORKERS, rate=handbook.CHECK_RATE) -> list:
+        """ go through the unit list and remove if not found in the handbook online.
+            only the status of each page is checked (workers at a time, at most rate
+            per second) and the gone units are deleted in one go. returns their codes.
+        """
+        codes = handbook.missing(list(self.units), UnitList.URL, workers, rate)
+        if len(codes) == 0:
+            return codes
+        STORE.delete_units(codes)
         for code in codes:
             del(self.units[code])
-            pathlib.Path(UNIT_PATH + code).unlink()
+            pathlib.Path(UNIT_PATH + code).unlink(missing_ok=True)
+            for hook in UNIT_HOOKS:
+                hook(code, None)
+        saved()
 
         with open(self.fname, 'w') as f:
             for code in sorted(list(self.units)):
                 f.write(code + "\n")
-
+        return codes
+
+    def refresh(self, names=None, workers=handbook.WORKERS, rate=handbook.RATE) -> dict:
+        """ re-checks units (names, default all in the list) against the handbook.
+            every page is fetched in one parallel pass (conditional GETs, so
+            unchanged pages usually aren't downloaded again) and only units whose
+            page content changed are parsed again, saved in one catalog write and
+            passed to UNIT_HOOKS. units no longer in the handbook are deleted.
+            pages are fetched by unit code, so "CITS2200 2024" is checked against
+            CITS2200. names that aren't a code (hand made copies like "CITS1003b")
+            are left alone and reported as failed.
+            returns {"added": [...], "removed": [...], "modified": [...],
+                     "unchanged": [...], "failed": [...]}
+        """
+        names = list(self.units) if names is None else list(dict.fromkeys(names))
+        report = {"added": [], "removed": [], "modified": [], "unchanged": [], "failed": []}
+
+        def fetch(name):
+            code = name.split()[0]
+            if not self.is_code(code):
+                raise LookupError(f"{code} isn't a unit code")
+            response = handbook.fetch(Unit.URL + code, max_age=0)
+            if response.status_code == 404 and not handbook.OFFLINE:
+                return []
+            if response.status_code != 200:
+                raise LookupError(f"status {response.status_code}" if not handbook.OFFLINE
+                                  else "not in the page cache")
+            return page_lines(response.text)
+
+        changed = {}
+        for name, text in handbook.crawl(names, fetch, workers, rate):
+            if isinstance(text, Exception):
+                print(f"could not refresh the unit, {name}... skipping... ({text})")
+                report["failed"].append(name)
+                continue
+            old = self.units.get(name)
+            if len(text) == 0:
+                report["removed" if name in self.units else "failed"].append(name)
+                continue
+            if old is not None and old.content_hash() == catalog.text_hash(text):
+                report["unchanged"].append(name)
+                continue
+            try:
+                unit = Unit(name.split()[0], text, False)
+                unit.update_values()
+            except Exception as e:
+                print(f"could not make the unit, {name}... skipping... ({e})")
+                report["failed"].append(name)
+                continue
+            changed[name] = unit
+            report["modified" if old is not None else "added"].append(name)
+
+        if len(changed) > 0 or len(report["removed"]) > 0:
+            with STORE.batch() as batch:
+                for name, unit in changed.items():
+                    batch.put_unit(unit, name)
+                for name in report["removed"]:
+                    batch.delete_unit(name)
+        for name, unit in changed.items():
+            self.units[name] = unit
+            for hook in UNIT_HOOKS:
+                hook(name, unit)
+        for name in report["removed"]:
+            del(self.units[name])
+            pathlib.Path(UNIT_PATH + name).unlink(missing_ok=True)
+            for hook in UNIT_HOOKS:
+                hook(name, None)
+        if len(changed) > 0 or len(report["removed"]) > 0:
+            saved()
+        for key in report:
+            report[key].sort()
+        return report
 
     def get_next_unit_code(self, ucode, bound=90, start='A') -> str:
         """ ucode is the unit code, which is always 4 letters and 4 digits
@@ -422,56 +684,100 @@ class UnitList:
                 ucode[:4].isalpha())
 
 
-    def find_units(self, ucode="", stop="6000") -> list:
-        """ Try entire possible unit codes and retrieve all units.
-            This is to discover any new units.
-            if ucode is provided, only that code will be checked.
-            This is VERY slow.
+    def unit_codes(self, ucode="", stop="6000"):
+        """ yields every possible unit code in the same order find_units walks them.
+            if ucode is provided, only the codes from ucode to the stop number
+            with the same letters are generated.
         """
-        #some starting unit code
         if ucode == "":
-            uletter = "AAAA" 
+            uletter = "AAAA"
             unumber = "1000"
-        elif self.is_code(ucode):
+        else:
             uletter = ucode[:4]
             unumber = ucode[4:]
-        else:
-            print(f"the code, {ucode}, is not valid unit code... exiting...")
-            return
- 
-        while (uletter + unumber != "ZZZZ" + stop):
-            print(f"Checking: {uletter + unumber}")
-            if (uletter + unumber) not in self.units:
-                unit = Unit(uletter + unumber)
-                if len(unit.text) > 0:
-                    print(f"Found unit: {unit.code}!")
 
-                    #update the unit list
-                    self.update_unit_list(unit)
-
-                    #save the new unit object
-                    unit.save()
-            else:
-                print(f"{uletter + unumber} already in the list... skipping...")
+        while (uletter + unumber != "ZZZZ" + stop):
+            yield uletter + unumber
             if unumber < stop:
                 unumber = self.get_next_unit_code(unumber, 57, "0")
             elif (unumber == stop):
-                uletter = self.get_next_unit_code(uletter, 90, "A")
-                unumber = "1000"
                 if (len(ucode) > 0): #finished for the given unit code
                     return
-        return
+                uletter = self.get_next_unit_code(uletter, 90, "A")
+                unumber = "1000"
+
+    def find_units(self, ucode="", stop="6000", workers=handbook.WORKERS, rate=handbook.RATE) -> list:
+        """ Try entire possible unit codes and retrieve all units.
+            This is to discover any new units.
+            if ucode is provided, only that code will be checked.
+            Pages are fetched by a pool of workers (workers) over pooled connections,
+            with at most rate requests per second sent to the handbook.
+            Each found unit is added to the list and saved as soon as it arrives.
+            Returns the list of new unit codes found.
+        """
+        if ucode != "" and not self.is_code(ucode):
+            print(f"the code, {ucode}, is not valid unit code... exiting...")
+            return
+
+        def fetch(code):
+            unit = Unit()
+            unit.code = code
+            text = unit.get_text()
+            return Unit(code, text, False) if len(text) > 0 else None
+
+        def todo():
+            for code in self.unit_codes(ucode, stop):
+                if code not in self.units:
+                    yield code
+                else:
+                    print(f"{code} already in the list... skipping...")
+
+        found = []
+        for code, unit in handbook.crawl(todo(), fetch, workers, rate):
+            print(f"Checking: {code}")
+            if isinstance(unit, Exception):
+                print(f"could not make the unit, {code}... skipping... ({unit})")
+            elif unit is not None:
+                print(f"Found unit: {unit.code}!")
+
+                #update the unit list
+                self.update_unit_list(unit)
+
+                #save the new unit object
+                unit.save()
+                found.append(unit.code)
+        return found
 
 
 
     def save_unit(self, unit):
         """saves the unit object"""
-        with open(UNIT_PATH + unit.code, 'wb') as f:
-            pickle.dump(unit, f)
+        STORE.put_unit(unit)
+        for hook in UNIT_HOOKS:
+            hook(unit.code, unit)
+        saved()
+
+    def save_units(self):
+        """saves every unit in the list into the catalog in one write"""
+        with STORE.batch() as batch:
+            for code, unit in self.units.items():
+                if unit is not None:
+                    batch.put_unit(unit, code)
+        for code, unit in self.units.items():
+            if unit is not None:
+                for hook in UNIT_HOOKS:
+                    hook(code, unit)
+        saved()
 
 
 class Course:
-    def __init__(self, url=None) -> None:
+    # ulist is a second unit list some old saved courses have,
+    # fname the name it was last saved or loaded as
+    __slots__ = ("url", "text", "title", "conversion", "bridging", "core", "option", "unitlist",
+                 "study_plan_s1", "study_plan_s2", "ulist", "fname")
+
+    def __init__(self, url=None, lazy=False, max_units=None) -> None:
+        """lazy and max_units are passed on to the course's UnitList"""
         self.url = url
         self.text = self.get_text()
         self.title = ""
@@ -485,15 +791,8 @@ class Course:
         if url and len(self.text) > 0:
             self.title = self.text.split(":")[0].strip()
             self.conversion, self.bridging, self.core, self.option = self.find_units()
-            units = []
-            [units.extend(value) for value in self.conversion.values()]
-            [units.extend(value) for value in self.bridging.values()]
-            [units.extend(value) for value in self.core.values()]
-            for values in self.option.values():
-                if len(values) > 0:
-                    for value in values:
-                        units.extend(value[1:])
-            self.unitlist = UnitList(ulist=units)
+            self.share()
+            self.unitlist = UnitList(ulist=self.structure_units(), lazy=lazy, max_units=max_units)
         # if len(self.core) > 0:
         #     self.get_study_plan()
                     
@@ -524,40 +823,81 @@ class Course:
             result += "\n" + "*" * 20 + "\n"
         return result.strip() 
 
+    def __getstate__(self) -> dict:
+        """the attributes that are set, as a dict (for pickle, copy and the catalog)"""
+        return {name: getattr(self, name) for name in Course.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state) -> None:
+        """sets the attributes from a saved attribute dict"""
+        for name in Course.__slots__:
+            if name in state:
+                setattr(self, name, state[name])
+        self.share()
+
+    def share(self) -> None:
+        """swaps the unit codes of the course structure for interned ones"""
+        for name in ("conversion", "bridging", "core"):
+            structure = getattr(self, name, {})
+            for level, codes in structure.items():
+                structure[level] = [shared(code) for code in codes]
+        option = getattr(self, "option", {})
+        for level, groups in option.items():
+            option[level] = [[shared(code) for code in group] for group in groups]
+
     def get_text(self):
         """fetch the text data from the url"""
         if self.url is not None:
-            response = requests.get(self.url)
+            response = handbook.fetch(self.url)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
-                #return [s.strip() for s in soup.get_text().splitlines() if s.strip()]
-                # below two lines replace the one above
-                text = soup.get_text().strip()
-                return " ".join([s.strip() for s in text.splitlines() if s.strip()])
+                return " ".join(extract.lines(response.text))
             else:
                 print("the url for the course doesn't exist...")
         return []
     
     def save(self, fname=""):
-        """save the current object into a file"""
+        """save the current object into the catalog"""
         fname = self.title if len(fname) == 0 else fname
-        with open(COURSE_PATH + fname, 'wb') as f:
-            pickle.dump(self, f)
-
-    def load(self, fname):
-        """returns the saved course file"""
+        self.fname = fname
+        STORE.put_course(self, fname)
+        for hook in COURSE_HOOKS:
+            hook(fname, self)
+        saved()
+
+    def load(self, fname, lazy=False, max_units=None):
+        """ returns the saved course from the catalog (or an old course file).
+            with lazy=True its units are only loaded when used.
+        """
+        course = STORE.get_course(fname, load_units=not lazy)
+        if course is not None:
+            course.fname = fname
+            if lazy:
+                course.unitlist = UnitList(ulist=course.unitlist.ulist, lazy=True, max_units=max_units)
+            return course
         try:
-            with open(COURSE_PATH + fname, 'rb') as f:
-                return pickle.load(f)
+            return catalog.load_pickle(COURSE_PATH + fname)
         except FileNotFoundError:
             print(f"this course: {fname}, doesn't exist... try making it...")
         return None
     
-    def update(self):
-        """update units in the course from handbook"""
-        for code, unit in self.unitlist.units.items():
-            if not type(unit):
-                self.unitlist.units[code] = unit.update()
+    def structure_units(self) -> list:
+        """the unit codes named in the course structure (conversion, bridging, core and option)"""
+        units = []
+        [units.extend(value) for value in self.conversion.values()]
+        [units.extend(value) for value in self.bridging.values()]
+        [units.extend(value) for value in self.core.values()]
+        for values in self.option.values():
+            for value in values:
+                units.extend(value[1:])
+        return [code for code in dict.fromkeys(units) if not code.endswith("points")]
+
+    def update(self, workers=handbook.WORKERS, rate=handbook.RATE) -> dict:
+        """ update units in the course from handbook, fetching them in parallel.
+            only units whose content changed are rewritten (see UnitList.refresh),
+            and units of the course structure missing from the unit list are added.
+            returns the change report. save the course to keep added or removed units.
+        """
+        names = list(self.unitlist.units) + self.structure_units()
+        return self.unitlist.refresh(names, workers, rate)
 
     
     def match_code(self, text):
@@ -573,68 +913,14 @@ class Course:
     
 
     def find_units(self) -> dict:
-        """ Given the url of the course, fetch all the units outlined.
-        """        
-        text = self.text
-        # cut out only the units in the course structure
-        # some degrees have different layouts...
-        if "Master of Professional Engineering" in text:
-            prem = text[text.index("Course structure details"):
-                        text.index("Biomedical Engineering specialisation")]
-            after = text[text.index("Software Engineering specialisation"):
-                        text.index("Meet our students")]
-            after = after.replace("Take unit(s) to the value of 36 points", "Option - Take unit(s) to the value of 36 points")
-            text = prem + " " + after
-        elif "Software Engineering major units." in text:
-            text = text[text.index("Software Engineering major units."):text.index("Course structure details Your degree options")]
-        elif "Accreditation" in text:
-            text = text[text.index("Course structure details"):text.index("Accreditation")]
-        elif "Course accreditation" in text:
-            text = text[text.index("Course structure details"):text.index("Course accreditation")]
-        
-
-        text = text.replace("Honours", "")
-        text = text[text.index("Level 1"):]
-        if "Level" in text:
-            textlist = text.split("Level")[1:]
-            if "Option" in text:
-                textlist = [text.strip().split("Option") for text in textlist]
-            else:
-                textlist = [[text] for text in textlist]
-        elif "Conversion" in text: #works for MIT
-            textlist = [t.split("Option") for t in text.split("Core")]
-        level = 0
-
-        #keeps the list of conversion, core and option units
-        core, option, conversion, bridging = {}, {}, {}, {}
-
-        for text in textlist:
-            options = []
-            for i in range(len(text)):
-                if any(["Conversion" in t for t in text]):
-                    conversion[level] = self.match_code(text[0])
-                    continue
-                elif level == 0:
-                    level += 1
-                if "Bridging" in text[i]:
-                    bridging[level] = self.match_code(" ".join(text[i].split("Bridging")[1:]))
-                    text[i] = " ".join(text[i].split("Bridging")[:1])
-                if i == 0:
-                    core[level] = [code for code in self.match_code(text[i]) if self.is_code(code)]
-                else:
-                    options.append(self.match_code(text[i]))
-            option[level] = options
-
+        """ returns (conversion, bridging, core, option) of the course, read from
+            the course page in one pass (see structure.py for the layouts).
+        """
+        with instrument.timer("parse.course"):
+            conversion, bridging, core, option = structure.parse(self.text)
+        for level in option:
             print(f"Level {level} Done!")
-            level += 1
-
-        # #up to 5 levels
-        # for level in range(1, 6):
-        #     core, option, conversion, text = self.get_units(core, option, conversion, level, text)
-
         return conversion, bridging, core, option
-    
-
 
     def add_unitlist(self, unit, cat="core", level=-1, group=1):
         """add the unit to the unitlist"""
@@ -649,7 +935,10 @@ class Course:
             else:
                 self.option[level].append([unit.code])
             self.unitlist.ulist.append(unit.code)
-        self.unitlist = UnitList(ulist=self.unitlist.ulist)
+        self.unitlist = UnitList(ulist=self.unitlist.ulist, lazy=self.unitlist.lazy,
+                                 max_units=self.unitlist.max_units)
+        for hook in COURSE_HOOKS:
+            hook(getattr(self, "fname", "") or self.title, self, False)
 
     def remove_unitlist(self, code, cat="core"):
         """remove the unit from the unitlist"""
@@ -664,199 +953,155 @@ class Course:
                     if code in v[i]:
                         self.option[k][i].remove(code)
                         self.unitlist.ulist.remove(code)
-        self.unitlist = UnitList(ulist=self.unitlist.ulist)
+        self.unitlist = UnitList(ulist=self.unitlist.ulist, lazy=self.unitlist.lazy,
+                                 max_units=self.unitlist.max_units)
+        for hook in COURSE_HOOKS:
+            hook(getattr(self, "fname", "") or self.title, self, False)
+
+    def prereq_bits(self):
+        """the prerequisites of the course's units compiled to bitmasks (see prereq.PrereqBits)"""
+        return prereq_expr.PrereqBits(self.unitlist.units)
+
+    def load_plan_units(self, store=None) -> None:
+        """loads core and option units the unit list doesn't have yet from the catalog (or store)"""
+        missing = [name for name in scheduler.course_units(self) if self.unitlist.units.get(name) is None]
+        for group in [g for groups in self.option.values() for g in groups]:
+            missing += [name for name in group[1:] if self.unitlist.units.get(name) is None]
+        if len(missing) > 0:
+            self.unitlist.units.update((STORE if store is None else store).load_units(missing))
+
+    def get_study_plan(self, intake=1, options=None, strict=False, store=None) -> dict:
+        """ works out the study plan for a semester 1 or 2 intake (see scheduler.py),
+            keeps it in study_plan_s1 or study_plan_s2 and returns it.
+            the keys are the years and semesters (Y1S1, Y1S2, ...) in the order
+            they're taken, the values the units taken that semester.
+            units the unit list doesn't have are loaded from store (default the catalog).
+        """
+        with instrument.timer("plan.load"):
+            self.load_plan_units(store)
+        with instrument.timer("plan.schedule"):
+            plan = scheduler.schedule(self, intake, options, strict=strict)
+        instrument.count("plan.plans")
+        for warning in plan.warnings:
+            print(warning)
+        if intake == 1:
+            self.study_plan_s1 = plan.semesters
+        else:
+            self.study_plan_s2 = plan.semesters
+        return plan.semesters
 
-    # write a method get_study_plan that returns a dictionary of the study plan for the course. The dictionary keys are the years and semesters (Y1S1, Y1S2, Y2S1, Y2S2, Y3S1, Y3S2, Y4S1, Y4S2) and the values are lists of the units that can be taken in that year. in each semester, at most 4 units can be taken. The values are unit codes that can be taken in that year. The prerequisites of each unit are checked to ensure that the unit is taken in later years if the prerequisite has not been met.
     def get_study_plan_s1(self) -> dict:
-        
-        # #duplicate self.core dictionary to avoid changing the original
-        # all_units = copy.deepcopy(self.core)
-
-        all_units = copy.deepcopy(self.study_plan_s1)
-        #separating units based on semesters onto a new dictionary
-        for k, v in self.core.items():
-            for code in v:
-                current_unit = self.unitlist[code]
-                if 1 in current_unit.semester:
-                    all_units[f"Y{k}S1"].append(code)
-                if 2 in current_unit.semester:
-                    all_units[f"Y{k}S2"].append(code)
-        #now add option units to all_units
-        for k, v in self.option.items():
-            if len(v) > 0:
-                for prereq_set in v:
-                    if prereq_set[0] == "6 points":
-                        i = 1
-                        #skip units that are not offered
-                        while len(self.unitlist[prereq_set[i]].semester) < 1 and i < len(prereq_set):
-                            i += 1
-                        available_sem = list(self.unitlist[prereq_set[i]].semester)[0]
-                        all_units[f"Y{k}S{available_sem}"].append(prereq_set[i])
-                    elif prereq_set[0] == "12 points": #there should be at least 2 units in the list
-                        i = 1
-                        #skip units that are not offered
-                        while len(self.unitlist[prereq_set[i]].semester) < 1 and i < len(prereq_set):
-                            i += 1
-                        available_sem = list(self.unitlist[prereq_set[i]].semester)[0]
-                        all_units[f"Y{k}S{available_sem}"].append(prereq_set[i])
-                        i += 1
-                        #skip units that are not offered for 2nd unit
-                        while len(self.unitlist[prereq_set[i]].semester) < 1 and i < len(prereq_set):
-                            i += 1
-                        available_sem = list(self.unitlist[prereq_set[i]].semester)[0]
-                        all_units[f"Y{k}S{available_sem}"].append(prereq_set[i])
-        for k, v in all_units.items():
-            print(k, sorted(v))               
-        print("*"*50)
-        
-        #go through items in all_units and remove duplicates
-        exists = set()
-        remove = []
-        for k, v in all_units.items():
-            for code in v:
-                if code in exists:
-                    remove.append((k, code))
-                else:
-                    exists.add(code)
-        for val in remove:
-            all_units[val[0]].remove(val[1])
-        
-
-        #deal with honours project units that are 12 pts
-        saved = ""
-        first = False
-        second = False
-        for k, v in all_units.items():
-            if len(saved) > 0:
-                second = True
-            for code in v:
-                if code == "CITS4010" and not first:
-                    all_units[k].append(code)
-                    first = True
-                elif (code == "CITS4011") and first:
-                    saved = code
-                    all_units[k].remove(code)
-            if second:
-                all_units[k].append(saved)
-                all_units[k].append(saved)
-                saved = ""
-                second = False
-            
-    
-          
-        #now we will check the prerequisites of each unit
-        covered = set()
-        covered.add("MATH1721")
-        covered.add("MATH1720")
-        covered.add("MATH1012")
-        for k, v in all_units.items():
-            #making sure the units fit into sems
-            year = int(k[1])
-            sem = int(k[3])
-            possible = []
-            if len(v) > 4:
-                for code in v:
-                    #this checks if any units offered in both semesters
-                    unit = self.unitlist[code]
-                    if len(unit.semester) > 1 and unit.code not in HONOURS: #means availabled in both semesters
-                        possible.append(code)
-            if len(possible) > 0:
-                move_code = possible[0] #just move the first option
-                all_units[k].remove(move_code)
-                if sem == 1:
-                    all_units[f"Y{year}S2"].append(move_code)
-                else:
-                    all_units[f"Y{year+1}S1"].append(move_code)
-            elif len(v) > 4:
-                #let's check if we can move it up
-                if year > 2 and sem == 1:
-                    if len(all_units[f"Y{year-1}S1"]) < 4:
-                        i = 0
-                        while v[i] in HONOURS:
-                            i += 1
-                        move_code = v[i]
-                        all_units[k].remove(move_code)
-                        all_units[f"Y{year-1}S1"].append(move_code)
-                    else:
-                        #can't do anything about it with this unit.
-                        pass
-                elif year > 2 and sem == 2:
-                    if len(all_units[f"Y{year-1}S2"]) < 4:
-                        i = 0
-                        print(v[i])
-                        while v[i] in HONOURS:
-                            i += 1
-                        move_code = v[i]
-                        all_units[k].remove(move_code)
-                        all_units[f"Y{year-1}S2"].append(move_code)
-                    else:
-                        #can't do anything about it with this unit.
-                        pass
-                    
-
-
-                #should scan further year units and avoid prereqs.
-                pass
-
-
-            #prereq checking part
-            for code in v:
-                unit = self.unitlist[code]
-                if len(unit.prereqlist) > 0:
-                    for prereqs in unit.prereqlist:
-                        satisfied = True if set(prereqs).issubset(covered) else False
-                        if satisfied:
-                            #dont need to check other prerequisites
-                            break
-                    if not satisfied:
-                        #do something about sorting out prereq
-                        print(prereqs)
-                        print(f"{code} NOT COVERED")
-                        pass
-
-                #all passed, so add it to the covered set
-                covered.add(code[:8])
-                
-
-
-        
-        for k, v in all_units.items():
-            print(k, sorted(v))
-        #combines the core and option units into one dictionary
-        # for k, v in self.option.items():
-        #     if len(v) > 0:
-        #         for options in v:
-        #             all_units[k].append(options[0])
-
-        #using all_units we will populate the self.study_plan dictionary
-        #the keys are the years and semesters (Y1S1, Y1S2, Y2S1, Y2S2, Y3S1, Y3S2, Y4S1, Y4S2)
-
-
-
-        # print(self.core)
-        # print("*" * 20)
-        # print(self.option)
-        # print("*" * 20)
-        # print(all_units)
-
-
-
-
-
-
+        return self.get_study_plan(1)
+
+    def get_study_plan_s2(self) -> dict:
+        return self.get_study_plan(2)
+
+
+def update_courses(courses, workers=handbook.WORKERS, rate=handbook.RATE) -> dict:
+    """ refreshes the units of several courses with one parallel pass, each unit
+        shared between courses is only fetched once.
+        returns {course title: change report} (see UnitList.refresh).
+    """
+    combined = UnitList()
+    combined.units = {}
+    names = []
+    for course in courses:
+        combined.units.update((name, unit) for name, unit in course.unitlist.units.items() if unit is not None)
+        names += list(course.unitlist.units) + course.structure_units()
+    report = combined.refresh(names, workers, rate)
+    reports = {}
+    for course in courses:
+        mine = set(course.unitlist.units) | set(course.structure_units())
+        reports[course.title] = {key: [name for name in value if name in mine] for key, value in report.items()}
+        for name in mine:
+            if name in combined.units:
+                course.unitlist.units[name] = combined.units[name]
+            elif name in report["removed"] and name in course.unitlist.units:
+                del(course.unitlist.units[name])
+    return reports
+
+
+def check_rules(store=None) -> dict:
+    """ what renormalise() would change, without saving anything: the normalisation
+        rules (see normalise.py) applied again to every saved unit's page text.
+        returns {name: ((prereq, incompatibility) saved, (prereq, incompatibility) now)}
+        for the units that come out different, empty when a rule edit changes nothing.
+    """
+    store = STORE if store is None else store
+    normalise.rules(reload=True)
+    differ = {}
+    for name, unit in store.load_units(text=True).items():
+        before = (unit.prereq, unit.incompatibility)
+        unit.renormalise()
+        if (unit.prereq, unit.incompatibility) != before:
+            differ[name] = (before, (unit.prereq, unit.incompatibility))
+    return differ
+
+
+def renormalise(store=None) -> dict:
+    """ applies the normalisation rules (see normalise.py) again to every saved unit,
+        from its saved page text, so a rule change doesn't need the handbook.
+        units whose prerequisites or incompatibility changed are saved in one catalog
+        write and passed to UNIT_HOOKS. returns {name: [(rule set, text found), ...]}
+        for those units.
+    """
+    store = STORE if store is None else store
+    normalise.rules(reload=True)
+    changed = {}
+    units = store.load_units(text=True)
+    with store.batch() as batch:
+        for name, unit in units.items():
+            before = (unit.prereq, unit.incompatibility)
+            fired = []
+            unit.renormalise(fired)
+            if (unit.prereq, unit.incompatibility) != before:
+                batch.put_unit(unit, name)
+                changed[name] = fired
+    for name in changed:
+        for hook in UNIT_HOOKS:
+            hook(name, units[name])
+    if len(changed) > 0:
+        saved()
+    return changed
+
+
+def find_courses(urls, lazy=True, max_units=None, workers=handbook.WORKERS, rate=handbook.RATE) -> dict:
+    """ makes the Course of every url, fetching the course pages in parallel.
+        the units are lazy by default, so only the course pages are fetched.
+        returns {url: Course}, courses whose page couldn't be fetched are left out.
+    """
+    courses = {}
+    for url, course in handbook.crawl(urls, lambda url: Course(url, lazy=lazy, max_units=max_units), workers, rate):
+        if isinstance(course, Exception):
+            print(f"{url}: {course}")
+        elif len(course.text) > 0:
+            courses[url] = course
+    return courses
+
+
+catalog.register(Unit=Unit, UnitList=UnitList, Course=Course)
+STORE = catalog.CatalogStore(CATALOG_PATH)
 
 
 def url_check(code):
     """check the code data from web"""
-    response = requests.get(UnitList.URL + code)
-    soup = BeautifulSoup(response.text, "html.parser")
-    return [s.strip() for s in soup.get_text().splitlines() if s.strip()]
+    response = handbook.get(UnitList.URL + code)
+    return extract.lines(response.text)
 
 
 if __name__ == "__main__":
     ##################
     ###    UNIT    ###
     ##################
+    # # units and courses are saved in one catalog file (catalog.db).
+    # # old unit/course pickle files can be copied into it with
+    # #   python catalog.py migrate ./units/ ./courses/ ./catalog.db
+
+    # # handbook pages are cached under ./cache/ and only re-downloaded when they change.
+    # # set OFFLINE to re-parse everything from the cache without touching the network.
+    # handbook.OFFLINE = True
+    # handbook.cache = handbook.ResponseCache(ttl=7 * 24 * 60 * 60, max_size=50 * 1024 * 1024)
+
     # # you can make your own unit by providing the unit code as follows.
     # # by default it will retrieve the info from the handbook.
     # unit = Unit("CITS1001")
@@ -886,6 +1131,21 @@ if __name__ == "__main__":
     # unit = unit.load("CITS1003b")
     # print(unit)
     # print(unit.prereqlist)
+    # # the prerequisites are kept as an and/or expression, check them against completed units
+    # print(unit.is_unlocked({"CITS1001", "CITS1401"}))
+
+    # # the prerequisite graph of the whole catalog answers chain/unlock questions with a lookup
+    # from prereq_graph import PrereqGraph
+    # graph = PrereqGraph(STORE.load_units())
+    # UNIT_HOOKS.append(graph.update_unit)    # updated when units are saved
+    # print(graph.chain("CITS4404"), graph.unlocks("CITS2200"), graph.level("CITS4404"), graph.cycles)
+    # # which courses use a unit (core or option) and which units need it, see usage.py
+    # import usage
+    # uses = usage.open_index(STORE)
+    # UNIT_HOOKS.append(uses.update_unit)
+    # COURSE_HOOKS.append(uses.update_course)
+    # SAVE_HOOKS.append(uses.save)
+    # print(uses.impact("CITS2200"))
     # print(Unit().load("CITS1003"))
     # print(Unit().load("CITS1003").prereqlist)
 
@@ -901,18 +1161,40 @@ if __name__ == "__main__":
     # unitlist = UnitList(fname="unit_list.txt")
     # unitlist = UnitList(ulisit=["CITS1003", "CITS1401"])
 
+    # # lazy unit lists only load a unit the first time it's used,
+    # # and keep at most max_units of them loaded.
+    # unitlist = UnitList(fname="unit_list.txt", lazy=True, max_units=100)
+    # print(unitlist.stats())
+
     # # set your new fname, any changes will be saved here.
     # unitlist.set_fname("new_list.txt")
 
     # # below code scans all units (e.g., CITS1000 to CITS6000) and saves them
     # # edit the code and stop to discover a subset
     # # this method is used usually first time to populate the units
+    # # workers and rate set how many pages are fetched at once and the max requests per second
     # unitlist.find_units('CITS1000', stop="6000")
+    # unitlist.find_units('CITS1000', stop="6000", workers=16, rate=20)
+
+    # # timers and counters for fetching, parsing, the catalog and plans (see instrument.py),
+    # # or run with INSTRUMENT=stats.json to have them written out at exit
+    # instrument.enable()
+    # unitlist.find_units('CITS1000', stop="2000")
+    # print(instrument.report())
+
+    # # to try a crawl without the real handbook, run the local stand-in (see standin.py)
+    # # and point the program at it, either with HANDBOOK_BASE_URL or from here
+    # import standin
+    # with standin.serve(latency=0.05, rate=50, errors=0.01) as server:
+    #     handbook.BASE_URL = server.url
+    #     unitlist.find_units('CITS1000', stop="2000", workers=16, rate=None)
+    #     print(server.stats())
 
     # # You can clean up your unit files by calling this
     # # it will go over your current list from unit_list.txt and delete
     # # ones no longer available in the handbook.
     # unitlist.remove_none_units()
+    # unitlist.remove_none_units(workers=64, rate=200)
 
     # # You can output the current units as text in the unitlist as follows.
     # # by default it will save to its own file name, but you can specify other names.
@@ -946,7 +1228,17 @@ if __name__ == "__main__":
     # course = Course().load("Data Science 2024")
     # print(course)
     # # update the course units' contentsx from handbook by updating
-    # course.update()
+    # # only units whose page changed are rewritten, it returns what was added/removed/modified
+    # print(course.update())
+    # # or refresh several courses in one pass
+    # courses = [Course().load(name) for name in STORE.course_names()]
+    # print(update_courses(courses, workers=16))
+    # # after changing normalise_rules.json, redo the prerequisites of every saved unit
+    # print(check_rules())
+    # print(renormalise())
+    # # or read many courses at once, only the course pages are fetched
+    # courses = find_courses(["https://www.uwa.edu.au/study/courses/data-science",
+    #                         "https://www.uwa.edu.au/study/Courses/Artificial-Intelligence"], workers=8)
 
     # # you can save courses using the save method.
     # # the title is used as the file name, unless provided
@@ -955,6 +1247,26 @@ if __name__ == "__main__":
 
     # print(course)
     print(course.get_study_plan_s1())
+    # # plans for a semester 2 intake, or with chosen option units, see scheduler.py
+    # print(course.get_study_plan_s2())
+    # print(course.get_study_plan(1, options={"SCIE2100": 3}, strict=True))
+    # # plans for every saved course and both intakes, in parallel (or python plan.py --all)
+    # import plan
+    # for result in plan.plan_all(workers=4):
+    #     print(result["course"], result["intake"], result.get("semesters", result.get("error")))
+    # # count every plan (all option combinations), stream them, or take the best few
+    # course.load_plan_units()
+    # print(scheduler.count_plans(course, 1))
+    # for plan in scheduler.iter_plans(course, 2):
+    #     print(plan)
+    # for score, plan in scheduler.best_plans(course, 1, k=5, score=scheduler.semester_1_units):
+    #     print(score, plan, sep="\n")
+
+    # # a whole cohort can be checked against the course at once (needs numpy), see cohort.py
+    # import cohort
+    # done = cohort.completed_matrix([{"CITS1401", "CITS1402"}, {"CITS1003"}], ["CITS1003", "CITS1401", "CITS1402"])
+    # result = cohort.check_cohort(done, ["CITS1003", "CITS1401", "CITS1402"], course)
+    # print(result.counts())
 
  
 
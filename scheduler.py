@@ -0,0 +1,591 @@
+"""
+    works out a semester by semester study plan for a course.
+    every core unit and the chosen option units are placed so that
+        - a unit comes after the units its prerequisites need
+        - a unit is only placed in a semester it's offered in (Unit.semester)
+        - a unit isn't taken before the year of its level in the course structure
+        - each semester has at most MAX_UNITS units worth of points
+          (a 12 point unit takes two places, honours projects can be split over
+          two semesters, one place in each)
+    units are tried in prerequisite order (longest chain of units still to come
+    first) and the search backtracks when a choice leaves no way to finish, so if
+    a plan exists it is found, and the same course always gives the same plan.
+
+        plan = schedule(course, intake=2)
+        plan.semesters      # {"Y1S2": [...], "Y1S1": [...], ...}
+        plan.warnings       # prerequisites that had to be relaxed (strict=False)
+
+    PlanError is raised with the constraint that can't be met if there's no plan.
+
+    every plan can be counted, streamed or ranked as well, over all the ways of
+    making up the option groups. the search remembers how many plans follow each
+    (semester, units left) state, so shared endings are only worked out once and
+    branches that lead nowhere are never walked.
+
+        count_plans(course, intake=1)
+        for plan in iter_plans(course): ...
+        best_plans(course, k=5, score=semester_1_units)     # [(score, Plan), ...]
+"""
+
+import heapq
+from itertools import combinations
+from operator import itemgetter
+
+import instrument
+import prereq
+from prereq_graph import PrereqGraph
+
+MAX_UNITS = 4           # units (of UNIT_POINTS each) per semester
+UNIT_POINTS = 6
+HONOURS = ("CITS4010", "CITS4011")      # multi-semester units that may be split
+ASSUMED = ("MATH1721", "MATH1720", "MATH1012")      # counted as done before the course
+SEARCH_LIMIT = 200000   # states tried before giving up
+MAX_EARLY = 2           # units a plan may take before their level when early > 0
+EARLY = "no plan with every unit in the year of its level, some units are taken a year early"
+
+
+class PlanError(Exception):
+    """ no plan satisfies the constraints.
+        constraint is one of "offering", "prerequisite", "unit", "option",
+        "capacity", "schedule" and units the units it's about.
+    """
+    def __init__(self, message, constraint, units=()) -> None:
+        super().__init__(message)
+        self.constraint = constraint
+        self.units = list(units)
+
+
+class Plan:
+    """semesters maps Y1S1 style labels to the unit names taken then, in order"""
+    def __init__(self, semesters, warnings) -> None:
+        self.semesters = semesters
+        self.warnings = warnings
+
+    def __str__(self):
+        return "\n".join(f"{label}: {', '.join(units)}" for label, units in self.semesters.items())
+
+
+def semesters_used(label, units) -> int:
+    """score for best_plans: the number of semesters with any study, fewest first"""
+    return 1 if len(units) > 0 else 0
+
+
+def semester_1_units(label, units) -> int:
+    """score for best_plans: the most units taken in semester 1 first"""
+    return -len(units) if label.endswith("S1") else 0
+
+
+def labels(intake=1, years=4) -> list:
+    """semester labels in the order they're taken, e.g. Y1S2, Y1S1, Y2S2 ... for a semester 2 intake"""
+    order = (1, 2) if intake == 1 else (2, 1)
+    return [f"Y{year}S{sem}" for year in range(1, years + 1) for sem in order]
+
+
+def offered(unit) -> set:
+    """the semesters (1 and/or 2) a unit runs in. older saved units only have offer"""
+    if hasattr(unit, "semester"):
+        return set(unit.semester)
+    offer = getattr(unit, "offer", ())
+    if isinstance(offer, str):
+        return set()
+    return {int(row[0][-1]) for row in offer if row[0][-1] in "12"}
+
+
+def places(unit) -> int:
+    """number of places in a semester the unit takes"""
+    return max(1, getattr(unit, "credit", UNIT_POINTS) // UNIT_POINTS)
+
+
+def relax(expr, possible):
+    """ the expression with the parts no unit in possible can satisfy taken out.
+        returns (expr, True if nothing had to be taken out).
+    """
+    if expr is None:
+        return None, True
+    if isinstance(expr, str):
+        return (expr, True) if expr in possible else (None, False)
+    results = [relax(term, possible) for term in expr[1:]]
+    if expr[0] == "or":
+        kept = [term for term, ok in results if ok]
+        return (prereq.join("or", kept), True) if len(kept) > 0 else (None, False)
+    return prereq.join("and", [term for term, _ in results]), all(ok for _, ok in results)
+
+
+def course_units(course) -> dict:
+    """ {name: level} for the core units, one name per unit code.
+        when a unit is listed both plain and with a year ("CITS2402", "CITS2402 2024")
+        the one with the year is used.
+    """
+    names = {}
+    for level in sorted(course.core):
+        for name in course.core[level]:
+            if name[:8] not in names or len(name) > 8:
+                names[name[:8]] = (name, level)
+    return {name: level for name, level in names.values()}
+
+
+def option_choices(course, units, taken, assumed=ASSUMED, strict=True):
+    """ yields every way of making up the option groups of the course, each as
+        {name: level} like choose_options. a unit is never picked twice or if it's
+        in taken, and a group's units have to add up to exactly its points.
+        with strict=True units that aren't offered or whose prerequisites can't be
+        met within the course are left out.
+    """
+    possible = set(assumed) | {name[:8] for name in taken}
+    groups = [(level, group) for level in sorted(course.option) for group in course.option[level]]
+    for _, group in groups:
+        possible |= {name[:8] for name in group[1:]}
+    picks = []
+    for level, group in groups:
+        points = int(group[0].split()[0])
+        allowed = []
+        for name in dict.fromkeys(group[1:]):
+            unit = units.get(name)
+            if name in taken or unit is None:
+                continue
+            if strict and (len(offered(unit)) == 0
+                           or not relax(unit.get_prereq_expr(), possible - {name[:8]})[1]):
+                continue
+            allowed.append(name)
+        credit = {name: getattr(units[name], "credit", UNIT_POINTS) for name in allowed}
+        picks.append((level, [names for n in range(1, len(allowed) + 1)
+                              for names in combinations(allowed, n)
+                              if sum(credit[name] for name in names) == points]))
+
+    def walk(k, chosen):
+        if k == len(picks):
+            yield dict(chosen)
+            return
+        level, ways = picks[k]
+        for names in ways:
+            if not any(name in chosen for name in names):
+                chosen.update((name, level) for name in names)
+                yield from walk(k + 1, chosen)
+                for name in names:
+                    del chosen[name]
+
+    yield from walk(0, {})
+
+
+def choose_options(course, units, taken, assumed=ASSUMED, strict=True) -> dict:
+    """ picks units for every option group ("6 points", codes...) of the course:
+        the first ones listed that are offered and whose prerequisites can be met
+        within the course. with strict=False a group with too few of those is
+        made up with the other units that have data. returns {name: level}.
+    """
+    possible = set(assumed) | {name[:8] for name in taken}
+    groups = [(level, group) for level in sorted(course.option) for group in course.option[level]]
+    for _, group in groups:
+        possible |= {name[:8] for name in group[1:]}
+    chosen = {}
+    for level, group in groups:
+        points = int(group[0].split()[0])
+        for fits in (True, False) if not strict else (True,):
+            for name in group[1:]:
+                if points <= 0:
+                    break
+                unit = units.get(name)
+                if name in taken or name in chosen or unit is None:
+                    continue
+                if fits and (len(offered(unit)) == 0
+                             or not relax(unit.get_prereq_expr(), possible - {name[:8]})[1]):
+                    continue
+                chosen[name] = level
+                points -= getattr(unit, "credit", UNIT_POINTS)
+        if points > 0:
+            raise PlanError(f"can't make up {group[0]} from {', '.join(group[1:])}",
+                            "option", group[1:])
+    return chosen
+
+
+class Scheduler:
+    """ one scheduling problem: the units to place (name -> Unit), the level of
+        each and the semesters available.
+    """
+    def __init__(self, units, levels, intake=1, years=None, assumed=ASSUMED, strict=True, early=0) -> None:
+        """ early is how many years before its level a unit may be taken, by at most
+            MAX_EARLY units of the plan
+        """
+        self.units = units
+        self.names = list(levels)
+        self.years = max(levels.values(), default=1) if years is None else years
+        self.labels = labels(intake, self.years)
+        self.assumed = set(assumed)
+        self.strict = strict
+        self.warnings = []
+        self.tried = 0
+        self.counts = {}        # (semester, units left, carry, spare) -> plans from there, see count_from
+        self.open = {}          # (semester, units left, carry, spare) -> whether any plan follows, see possible
+
+        codes = {name[:8] for name in self.names}
+        possible = codes | self.assumed
+        self.exprs = {}
+        self.offered = {}
+        for name in self.names:
+            unit = units[name]
+            if unit is None:
+                raise PlanError(f"{name} has no unit data", "unit", [name])
+            expr, ok = relax(unit.get_prereq_expr(), possible - {name[:8]})
+            if not ok:
+                if strict:
+                    raise PlanError(f"{name} needs {prereq.to_text(unit.get_prereq_expr())}, "
+                                    f"which can't be met within the course", "prerequisite", [name])
+                self.warnings.append(f"{name}: prerequisites outside the course ignored, "
+                                     f"needs {prereq.to_text(unit.get_prereq_expr())}")
+            self.exprs[name] = prereq.simplify(expr)
+            self.offered[name] = offered(unit)
+            if len(self.offered[name]) == 0:
+                if strict:
+                    raise PlanError(f"{name} isn't offered in either semester", "offering", [name])
+                self.warnings.append(f"{name}: not offered in a regular semester, placed anyway")
+                self.offered[name] = {1, 2}
+
+        # prerequisite order and how many units still have to follow each one
+        graph = PrereqGraph()
+        for name in self.names:
+            graph.set_prereqs(name, prereq.codes(self.exprs[name]) & codes)
+        by_code = {name[:8]: name for name in self.names}
+        self.height = {}
+        groups, _ = graph.order(set(graph.requires))
+        for group in reversed(groups):
+            for code in group:
+                later = [self.height[by_code[d]] for d in graph.required_by[code]
+                         if d not in group and d in by_code]
+                if code in by_code:
+                    self.height[by_code[code]] = 1 + max(later, default=0)
+        rank = {code: i for i, group in enumerate(groups) for code in group}
+        self.order = sorted(self.names, key=lambda n: (-self.height[n], levels[n], rank[n[:8]]))
+        self.bit = {name: 1 << i for i, name in enumerate(self.order)}
+        self.places = {name: places(units[name]) for name in self.names}
+        self.start = {name: 2 * (levels[name] - 1) for name in self.names}
+        self.earliest = {name: max(0, self.start[name] - 2 * early) for name in self.names}
+        self.spare = MAX_EARLY if early > 0 else 0
+        self.sems = [int(label[3]) for label in self.labels]
+        self.table = prereq.CodeTable(sorted(codes | self.assumed))
+        self.checks = {name: prereq.BitPrereq(self.exprs[name], self.table) for name in self.names}
+
+        # the last semester each unit can be finished in and still leave time for
+        # the units that need it, used to cut off hopeless branches early
+        self.latest = {}
+        for group in reversed(groups):
+            for code in group:
+                name = by_code[code]
+                last = len(self.labels) - 1
+                for d in graph.required_by[code]:
+                    if d not in group and d in by_code:
+                        last = min(last, self.latest[by_code[d]] - 1)
+                if name[:8] not in HONOURS or self.places[name] < 2:
+                    while last >= 0 and self.sems[last] not in self.offered[name]:
+                        last -= 1
+                self.latest[name] = last
+
+    def check(self) -> None:
+        """raises PlanError for problems that don't need a search to find"""
+        free = MAX_UNITS * len(self.labels)
+        needed = sum(self.places.values())
+        if needed > free:
+            raise PlanError(f"{needed} places needed but only {free} in {len(self.labels)} semesters",
+                            "capacity", self.names)
+        for name in self.names:
+            start = self.earliest[name]
+            if start >= len(self.labels):
+                raise PlanError(f"{name} is level {start // 2 + 1} but the plan is {self.years} years",
+                                "capacity", [name])
+            if not any(self.sems[i] in self.offered[name] for i in range(start, len(self.labels))):
+                raise PlanError(f"{name} isn't offered in any semester it could be taken in",
+                                "offering", [name])
+            if start + self.height[name] > len(self.labels) or self.latest[name] < start:
+                raise PlanError(f"{name} leads to a chain of {self.height[name] - 1} more units "
+                                f"which doesn't fit after year {start // 2 + 1}", "schedule", [name])
+
+    def solve(self) -> Plan:
+        self.check()
+        self.failed = set()
+        self.best = (-1, self.names)
+        self.tried = 0
+        result = self.place(*self.start_state())
+        if result is None:
+            left = self.best[1]
+            if self.tried >= SEARCH_LIMIT:
+                raise PlanError(f"gave up after {self.tried} tries, could not place {', '.join(left)}",
+                                "schedule", left)
+            raise PlanError(f"no order fits in {len(self.labels)} semesters, "
+                            f"could not place {', '.join(left)} ({self.reason(left[0])})", "schedule", left)
+        return Plan({label: units for label, units in zip(self.labels, result)}, self.warnings)
+
+    def reason(self, name) -> str:
+        """why a unit couldn't be placed in the best attempt, for the error message"""
+        done = set(self.table.decode(self.best[2]))
+        if not prereq.evaluate(self.exprs[name], done):
+            return "needs " + prereq.to_text(prereq.remaining(self.exprs[name], done))
+        return f"offered in semester {', '.join(map(str, sorted(self.offered[name])))}, no room left"
+
+    def place(self, i, remaining, carry, done, spare):
+        """ places the remaining units (bitmask over self.order) from semester i on.
+            carry is an honours unit that took its first place in semester i - 1.
+            done is the bitmask (self.table) of units completed before semester i.
+            spare is how many more units may be taken before their level.
+            returns a list of unit names per semester or None.
+        """
+        if remaining == 0 and carry is None:
+            return [[] for _ in self.labels[i:]]
+        if i == len(self.labels) or (i, remaining, carry, spare) in self.failed:
+            return None
+        self.tried += 1
+        if self.tried > SEARCH_LIMIT:
+            return None
+        left = [name for name in self.order if remaining & self.bit[name]]
+        placed = len(self.order) - len(left)
+        if placed > self.best[0]:
+            self.best = (placed, left, done)
+        for here, *state in self.moves(i, remaining, carry, done, spare):
+            later = self.place(i + 1, *state)
+            if later is not None:
+                return [here] + later
+        self.failed.add((i, remaining, carry, spare))
+        return None
+
+    def dead(self, i, remaining, carry) -> bool:
+        """True if the remaining units can't possibly fit in the semesters from i on"""
+        slots = len(self.labels) - i
+        left = [name for name in self.order if remaining & self.bit[name]]
+        if sum(self.places[name] for name in left) + (carry is not None) > MAX_UNITS * slots:
+            return True
+        if any(self.height[name] > slots or self.latest[name] < i for name in left):
+            return True
+        for sem in (1, 2):      # units only offered in one semester need room in those
+            need = sum(self.places[name] for name in left if self.offered[name] == {sem})
+            if need > MAX_UNITS * self.sems[i:].count(sem):
+                return True
+        return False
+
+    def moves(self, i, remaining, carry, done, spare, ordered=True):
+        """ the ways of filling semester i (most promising first if ordered). yields
+            (units taken in semester i, remaining after, split unit, done after,
+            spare after).
+        """
+        if self.dead(i, remaining, carry):
+            return
+        instrument.count("plan.states")
+        sem = self.sems[i]
+        free = MAX_UNITS - (carry is not None)
+        candidates = [name for name in self.order
+                      if remaining & self.bit[name] and self.earliest[name] <= i
+                      and sem in self.offered[name] and self.checks[name].check(done)]
+        forced = {name for name in self.order if remaining & self.bit[name] and self.latest[name] == i}
+        if not forced <= set(candidates):
+            return
+        for taken, split in self.choices(candidates, free, i, forced, ordered, spare):
+            ahead = sum(i < self.start[name] for name in taken)
+            finished = self.table.mask(name[:8] for name in taken if name != split)
+            if carry is not None:
+                finished |= self.table.bit(carry[:8])
+            rest = remaining
+            for name in taken:
+                rest &= ~self.bit[name]
+            here = ([carry] if carry is not None else []) + list(taken)
+            yield here, rest, split, done | finished, spare - ahead
+
+    def start_state(self):
+        return 0, (1 << len(self.order)) - 1, None, self.table.mask(self.assumed), self.spare
+
+    def count(self) -> int:
+        """ the number of different plans. plans that only differ after the
+            same semester with the same units left are worked out once.
+        """
+        return self.count_from(*self.start_state())
+
+    def count_from(self, i, remaining, carry, done, spare) -> int:
+        if remaining == 0 and carry is None:
+            return 1
+        if i == len(self.labels):
+            return 0
+        key = (i, remaining, carry, spare)
+        if key not in self.counts:
+            self.counts[key] = sum(self.count_from(i + 1, *state)
+                                   for _, *state in self.moves(i, remaining, carry, done, spare, False))
+        return self.counts[key]
+
+    def feasible(self) -> bool:
+        """True if solve finds a plan (what schedule goes by before it relaxes anything)"""
+        try:
+            self.solve()
+        except PlanError:
+            return False
+        return True
+
+    def possible(self, i, remaining, carry, done, spare) -> bool:
+        """True if any plan follows the state, stops at the first one it finds"""
+        if remaining == 0 and carry is None:
+            return True
+        if i == len(self.labels):
+            return False
+        key = (i, remaining, carry, spare)
+        if key not in self.open:
+            self.open[key] = any(self.possible(i + 1, *state)
+                                 for _, *state in self.moves(i, remaining, carry, done, spare))
+        return self.open[key]
+
+    def plans(self):
+        """ yields every plan (a list of units per semester) one at a time, most
+            promising first. branches with no plan at the end are never entered
+            (see possible, nothing is counted).
+        """
+        def walk(i, remaining, carry, done, spare):
+            if remaining == 0 and carry is None:
+                yield [[] for _ in self.labels[i:]]
+                return
+            for here, *state in self.moves(i, remaining, carry, done, spare):
+                if self.possible(i + 1, *state):
+                    for later in walk(i + 1, *state):
+                        yield [here] + later
+
+        for semesters in walk(*self.start_state()):
+            yield Plan(dict(zip(self.labels, semesters)), self.warnings)
+
+    def best_plans(self, k=10, score=None) -> list:
+        """ the k plans with the lowest total score, as (score, Plan) pairs.
+            score(label, units) scores one semester, the default semesters_used.
+            each state keeps only its k best continuations.
+        """
+        score = semesters_used if score is None else score
+        best = {}
+
+        def top(i, remaining, carry, done, spare):
+            if remaining == 0 and carry is None:
+                return [(sum(score(label, []) for label in self.labels[i:]),
+                         [[] for _ in self.labels[i:]])]
+            if i == len(self.labels):
+                return []
+            key = (i, remaining, carry, spare)
+            if key not in best:
+                found = []
+                for here, *state in self.moves(i, remaining, carry, done, spare):
+                    cost = score(self.labels[i], here)
+                    found.extend((cost + c, [here] + later) for c, later in top(i + 1, *state))
+                best[key] = heapq.nsmallest(k, found, key=itemgetter(0))
+            return best[key]
+
+        return [(cost, Plan(dict(zip(self.labels, semesters)), self.warnings))
+                for cost, semesters in top(*self.start_state())]
+
+    def choices(self, candidates, free, i, forced=frozenset(), ordered=True, spare=MAX_EARLY):
+        """ every way of filling free places from candidates in semester i that
+            takes all of forced in full and at most spare units before their level.
+            with ordered, the ones with the fewest units taken before their level
+            come first, then the fullest and most urgent.
+            returns a list of (names, name of the split unit or None).
+        """
+        found = []
+
+        def pick(k, free, taken, split, missing, spare):
+            if k == len(candidates) or free == 0:
+                if missing == 0:
+                    found.append((tuple(taken), split))
+                return
+            name = candidates[k]
+            need = self.places[name]
+            must = name in forced
+            ahead = i < self.start[name]
+            if ahead <= spare:
+                if need <= free:
+                    taken.append(name)
+                    pick(k + 1, free - need, taken, split, missing - must, spare - ahead)
+                    taken.pop()
+                if split is None and need == 2 and name[:8] in HONOURS and not must and self.latest[name] > i:
+                    taken.append(name)
+                    pick(k + 1, free - 1, taken, name, missing, spare - ahead)
+                    taken.pop()
+            if not must:
+                pick(k + 1, free, taken, split, missing, spare)
+
+        pick(0, free, [], None, len(forced), spare)
+        if ordered:
+            rank = {option: n for n, option in enumerate(found)}
+            found.sort(key=lambda option: (sum(i < self.start[name] for name in option[0]),
+                                           -sum(self.places[name] for name in option[0]) + (option[1] is not None),
+                                           rank[option]))
+        return found
+
+
+def schedule(course, intake=1, options=None, units=None, years=None,
+             assumed=ASSUMED, strict=False) -> Plan:
+    """ the study plan for a course starting in semester intake (1 or 2).
+        options are the option unit names to take ({name: level}), by default
+        choose_options picks them. units is {name: Unit}, by default the course's
+        unit list. with strict=False prerequisites that can't be met within the
+        course (and units with no regular semester) are let through with a warning,
+        and if there's no plan otherwise units may be taken a year before their level.
+    """
+    units = course.unitlist.units if units is None else units
+    levels = course_units(course)
+    if options is None:
+        options = choose_options(course, units, levels, assumed, strict)
+    levels.update(options)
+    for name in levels:
+        if units.get(name) is None:
+            raise PlanError(f"{name} has no unit data", "unit", [name])
+    try:
+        return Scheduler(units, levels, intake, years, assumed, strict).solve()
+    except PlanError as e:
+        if strict or e.constraint != "schedule":
+            raise
+    plan = Scheduler(units, levels, intake, years, assumed, strict, early=1).solve()
+    plan.warnings.append(EARLY)
+    return plan
+
+
+def schedulers(course, intake=1, units=None, years=None, assumed=ASSUMED, strict=False, early=0):
+    """ yields a Scheduler for every option combination of the course (see
+        option_choices) that passes Scheduler.check. like schedule, with
+        strict=False a combination solve finds no plan for is tried again with
+        up to MAX_EARLY units taken a year before their level.
+    """
+    units = course.unitlist.units if units is None else units
+    levels = course_units(course)
+    for name in levels:
+        if units.get(name) is None:
+            raise PlanError(f"{name} has no unit data", "unit", [name])
+    for options in option_choices(course, units, levels, assumed, strict):
+        chosen = {**levels, **options}
+        try:
+            problem = Scheduler(units, chosen, intake, years, assumed, strict, early)
+            problem.check()
+            if strict or early > 0 or problem.feasible():
+                yield problem
+                continue
+        except PlanError as e:
+            if strict or early > 0 or e.constraint != "schedule":
+                continue
+        try:
+            problem = Scheduler(units, chosen, intake, years, assumed, strict, early=1)
+            problem.check()
+        except PlanError:
+            continue
+        problem.warnings.append(EARLY)
+        yield problem
+
+
+def count_plans(course, intake=1, **kwargs) -> int:
+    """ the number of different plans for the course over every option combination.
+        takes the same keyword arguments as schedulers.
+    """
+    return sum(problem.count() for problem in schedulers(course, intake, **kwargs))
+
+
+def iter_plans(course, intake=1, **kwargs):
+    """ yields every plan for the course, one option combination after another,
+        without building them all first.
+    """
+    for problem in schedulers(course, intake, **kwargs):
+        yield from problem.plans()
+
+
+def best_plans(course, intake=1, k=10, score=semesters_used, **kwargs) -> list:
+    """ the k best plans for the course over every option combination,
+        as (score, Plan) pairs lowest score first (see Scheduler.best_plans).
+    """
+    found = []
+    for problem in schedulers(course, intake, **kwargs):
+        found = heapq.nsmallest(k, found + problem.best_plans(k, score), key=itemgetter(0))
+    return found
@@ -0,0 +1,348 @@
+"""
+    a small json over http service for questions about the catalog, so index.html
+    (or anything else) can ask without starting python and loading the catalog
+    every time.
+        python service.py --port 8080
+    the catalog is loaded once: every unit, the prerequisites compiled to bitmasks
+    (prereq.PrereqBits) and the courses with their units. plans are worked out the
+    first time they're asked for and kept. when the catalog file changes it's
+    loaded again in the background and swapped in, requests keep being answered
+    from the old one until then.
+
+    GET
+        /unit?code=CITS2200[&year=2024]             unit details
+        /can_take?code=CITS3001&done=CITS1401,CITS2200
+            {"unit", "ok", "missing"} missing is the part of the prerequisites not met
+        /eligible?done=CITS1401,CITS1402&semester=1[&course=Data Science]
+            units not done yet whose prerequisites are met and that run in the semester
+            (in the course if one is given)
+        /plan?course=Data Science&intake=2[&strict=1]    {"semesters", "warnings"}
+        /courses                                    the saved course names
+        /stats                                      requests and latency (ms) per endpoint
+    units are looked up by code, the latest handbook year unless year is given.
+    done can be given as a comma separated list or as done=...&done=...
+    an error is {"error": message} with a 4xx status, or a 500 if something broke.
+    hand made unit copies saved under other names ("CITS1003b") aren't answered for.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import catalog
+import prereq
+import scheduler
+
+RELOAD_EVERY = 1.0      # seconds between checks of the catalog file
+SAMPLES = 10000         # latencies kept per endpoint for the percentiles
+REQUIRED = object()     # see one()
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+          500: "Internal Server Error"}
+
+
+class QueryError(Exception):
+    """a request that can't be answered, with the http status to answer it with"""
+    def __init__(self, message, status=400) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Catalog:
+    """everything the service answers from, loaded from the store in one go"""
+    def __init__(self, store) -> None:
+        if len(catalog.CLASSES) == 0:
+            import prerequisite_checker     # registers the classes catalog records are loaded as
+        store.refresh()
+        self.stamp = store.stamp
+        self.units = store.load_units()
+        self.by_code = {code: dict(years) for code, years in store.by_code.items()}
+        self.bits = prereq.PrereqBits(self.units)
+        self.courses = {}
+        for name in store.course_names():
+            course = store.get_course(name, load_units=False)
+            names = list(course.unitlist.ulist) + list(scheduler.course_units(course))
+            for groups in course.option.values():
+                for group in groups:
+                    names += group
+            course.unitlist.units = {name: self.units[name] for name in names if name in self.units}
+            self.courses[name] = course
+        self.plans = {}
+        self.lock = threading.Lock()
+
+    def find(self, code, year=None) -> str:
+        """the name the unit is saved under"""
+        years = self.by_code.get(code.upper()[:8], {})
+        if len(years) == 0:
+            raise QueryError(f"no unit {code}", 404)
+        if year is None:
+            return years[max(years)]
+        if str(year) not in years:
+            raise QueryError(f"no unit {code} for {year}", 404)
+        return years[str(year)]
+
+    def course(self, name):
+        if name not in self.courses:
+            raise QueryError(f"no course {name}", 404)
+        return self.courses[name]
+
+    def completed(self, done) -> int:
+        """the bitmask of the done codes (codes the catalog doesn't know are left out)"""
+        index = self.bits.table.index
+        return self.bits.table.mask(code for code in done if code in index)
+
+    def unit(self, name) -> dict:
+        unit = self.units[name]
+        details = {"name": name}
+        for field in catalog.UNIT_FIELDS + catalog.UNIT_DETAILS:
+            value = getattr(unit, field, None)
+            if field == "prereq_expr":
+                value = prereq.to_text(value)
+            elif isinstance(value, (set, frozenset)):
+                value = sorted(value)
+            details[field] = value
+        return details
+
+    def can_take(self, name, done) -> dict:
+        ok = self.bits.is_unlocked(name, self.completed(done))
+        missing = None if ok else prereq.remaining(self.units[name].get_prereq_expr(), done)
+        return {"unit": name, "ok": ok, "missing": prereq.to_text(missing)}
+
+    def eligible(self, done, semester=None, course=None) -> list:
+        if course is None:
+            names = [years[max(years)] for code, years in self.by_code.items() if is_code(code)]
+        else:
+            names = list(self.course(course).unitlist.units)
+        names = [name for name in names if name in self.bits.prereqs and name[:8] not in done]
+        if semester is not None:
+            names = [name for name in names if semester in scheduler.offered(self.units[name])]
+        return sorted(self.bits.unlocked(self.completed(done), names))
+
+    def plan(self, name, intake=1, strict=False) -> dict:
+        """the plan for the course, worked out once"""
+        key = (name, intake, strict)
+        with self.lock:
+            if key in self.plans:
+                return self.plans[key]
+        course = self.course(name)
+        try:
+            plan = scheduler.schedule(course, intake, strict=strict)
+            answer = {"course": name, "intake": intake, "semesters": plan.semesters,
+                      "warnings": plan.warnings}
+        except scheduler.PlanError as e:
+            answer = {"course": name, "intake": intake, "error": str(e),
+                      "constraint": e.constraint, "units": e.units}
+        with self.lock:
+            self.plans[key] = answer
+        return answer
+
+
+def is_code(code) -> bool:
+    """True for a unit code (four letters and four digits)"""
+    return len(code) == 8 and code[:4].isalpha() and code[4:].isdigit()
+
+
+def codes(query, key) -> set:
+    """the unit codes of a query parameter, comma separated and/or repeated"""
+    return {code.strip().upper()[:8] for value in query.get(key, []) for code in value.split(",") if code.strip()}
+
+
+def one(query, key, default=REQUIRED, kind=str):
+    """the (last) value of a query parameter as kind, default if it isn't there"""
+    if key not in query:
+        if default is REQUIRED:
+            raise QueryError(f"{key} is missing")
+        return default
+    try:
+        return kind(query[key][-1])
+    except ValueError:
+        raise QueryError(f"{key} should be a {kind.__name__}")
+
+
+def percentile(ordered, p) -> float:
+    """the p-th percentile (nearest rank) of sorted values"""
+    if len(ordered) == 0:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Service:
+    def __init__(self, store=None, interval=RELOAD_EVERY) -> None:
+        self.store = catalog.CatalogStore() if store is None else store
+        self.catalog = Catalog(self.store)
+        self.interval = interval
+        self.reloads = 0
+        self.latency = {}       # endpoint -> deque of seconds
+        self.counts = {}        # endpoint -> requests
+        self.endpoints = {"/unit": self.get_unit, "/can_take": self.get_can_take,
+                          "/eligible": self.get_eligible, "/plan": self.get_plan,
+                          "/courses": self.get_courses, "/stats": self.get_stats}
+
+    async def get_unit(self, query):
+        data = self.catalog
+        return data.unit(data.find(one(query, "code"), one(query, "year", None)))
+
+    async def get_can_take(self, query):
+        data = self.catalog
+        return data.can_take(data.find(one(query, "code")), codes(query, "done"))
+
+    async def get_eligible(self, query):
+        semester = one(query, "semester", None, int)
+        if semester not in (None, 1, 2):
+            raise QueryError("semester should be 1 or 2")
+        return self.catalog.eligible(codes(query, "done"), semester, one(query, "course", None))
+
+    async def get_plan(self, query):
+        data = self.catalog
+        intake = one(query, "intake", 1, int)
+        if intake not in (1, 2):
+            raise QueryError("intake should be 1 or 2")
+        strict = one(query, "strict", "0") not in ("0", "false", "")
+        key = (one(query, "course"), intake, strict)
+        if key in data.plans:
+            return data.plans[key]
+        # working a plan out can take a while, don't hold up the other requests
+        return await asyncio.to_thread(data.plan, *key)
+
+    async def get_courses(self, query):
+        return sorted(self.catalog.courses)
+
+    async def get_stats(self, query):
+        return self.stats()
+
+    def stats(self) -> dict:
+        """{endpoint: {requests, p50, p90, p99, max}} with times in ms, plus reloads"""
+        endpoints = {}
+        for endpoint, samples in sorted(self.latency.items()):
+            ordered = sorted(samples)
+            endpoints[endpoint] = {"requests": self.counts[endpoint],
+                                   **{f"p{p}": round(percentile(ordered, p) * 1000, 3) for p in (50, 90, 99)},
+                                   "max": round(ordered[-1] * 1000, 3)}
+        return {"endpoints": endpoints, "reloads": self.reloads, "units": len(self.catalog.units),
+                "courses": len(self.catalog.courses)}
+
+    def record(self, endpoint, seconds) -> None:
+        if endpoint not in self.latency:
+            self.latency[endpoint] = deque(maxlen=SAMPLES)
+            self.counts[endpoint] = 0
+        self.latency[endpoint].append(seconds)
+        self.counts[endpoint] += 1
+
+    async def answer(self, method, target):
+        """(endpoint, status, json payload) for a request"""
+        endpoint = "other"
+        try:
+            url = urlsplit(target)
+            endpoint = url.path if url.path in self.endpoints else "other"
+            if method not in ("GET", "HEAD"):
+                return endpoint, 405, {"error": f"{method} isn't supported"}
+            if endpoint == "other":
+                return endpoint, 404, {"error": f"no endpoint {url.path}"}
+            return endpoint, 200, await self.endpoints[endpoint](parse_qs(url.query))
+        except QueryError as e:
+            return endpoint, e.status, {"error": str(e)}
+        except Exception as e:
+            return endpoint, 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def handle(self, reader, writer) -> None:
+        """answers the requests of one connection (kept open for HTTP/1.1)"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                started = time.perf_counter()
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = header.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                length = headers.get("content-length", "0") or "0"
+                if not length.isdigit():
+                    # can't tell where the next request starts, answer and hang up
+                    endpoint, status, payload = "other", 400, {"error": "bad Content-Length"}
+                    keep = False
+                else:
+                    if int(length) > 0:
+                        await reader.readexactly(int(length))
+                    endpoint, status, payload = await self.answer(method, target)
+                body = json.dumps(payload).encode("utf-8")
+                head = (f"HTTP/1.1 {status} {STATUS.get(status, '')}\r\n"
+                        f"Content-Type: application/json\r\n"
+                        f"Content-Length: {len(body)}\r\n"
+                        f"Access-Control-Allow-Origin: *\r\n"
+                        f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n")
+                writer.write(head.encode("latin-1") + (body if method != "HEAD" else b""))
+                await writer.drain()
+                self.record(endpoint, time.perf_counter() - started)
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def watch(self) -> None:
+        """loads the catalog again whenever the file changes"""
+        path = self.store.path
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if (st.st_mtime_ns, st.st_size) != self.catalog.stamp:
+                try:
+                    self.catalog = await asyncio.to_thread(Catalog, self.store)
+                    self.reloads += 1
+                except (OSError, ValueError, EOFError) as e:    # caught mid write, try again
+                    print(f"reloading the catalog failed: {e}")
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None) -> None:
+        """ answers requests until cancelled. ready (an asyncio.Event) is set once
+            it's listening, self.port is the port (useful with port 0).
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        watcher = asyncio.create_task(self.watch())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="json service answering questions about the catalog")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--catalog", default=catalog.CATALOG_PATH)
+    parser.add_argument("--reload", type=float, default=RELOAD_EVERY, help="seconds between catalog checks")
+    args = parser.parse_args(argv)
+
+    service = Service(catalog.CatalogStore(args.catalog), args.reload)
+    print(f"{len(service.catalog.units)} units and {len(service.catalog.courses)} courses, "
+          f"on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(service.stats()))
+
+
+if __name__ == "__main__":
+    main()
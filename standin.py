@@ -0,0 +1,223 @@
+"""
+    a local stand-in for the UWA handbook, so the crawler can be run and timed
+    without the network.
+    it serves recorded pages:
+        /unitdetails?code=CITS2200      unit pages, 404 for codes it doesn't have
+        /study/Courses/...              course pages, by the path of the course url
+    unit pages come from benchmarks/pages/ (see benchmarks/bench_suite.py record)
+    or are made from the page text of the units in the catalog, course pages from
+    the courses in the catalog. the handbook page cache (handbook.cache) wins over
+    both when it has the page.
+
+    it can make things harder on purpose:
+        latency     seconds added to every response (plus up to jitter more)
+        rate        requests per second it answers, anything over that gets a 429
+        errors      fraction of requests answered with a 500
+
+    run it and point the program at it:
+        python standin.py --port 8000 --latency 0.05 --rate 50 --errors 0.01
+        HANDBOOK_BASE_URL=http://localhost:8000 python prerequisite_checker.py
+
+    or from python:
+        with standin.serve(latency=0.05) as server:
+            handbook.BASE_URL = server.url
+            UnitList().find_units("CITS1000", stop="1100")
+            print(server.stats())
+"""
+
+import argparse
+import json
+import pathlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import catalog
+import handbook
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / "benchmarks" / "pages"
+UNIT_URL = "https://handbooks.uwa.edu.au/unitdetails?code="
+
+
+def page(lines) -> str:
+    """an html page with one paragraph per line"""
+    return "<html><body>\n" + "\n".join(f"<p>{escape(line)}</p>" for line in lines) + "\n</body></html>\n"
+
+
+def recorded_pages(store=None, fixtures=FIXTURES, cache=None) -> tuple:
+    """ returns ({unit name: html}, {course url path (lower case): html}) from the
+        fixtures, the catalog and the page cache.
+    """
+    if len(catalog.CLASSES) == 0:
+        import prerequisite_checker     # registers the classes catalog records are loaded as
+    store = catalog.CatalogStore() if store is None else store
+    units = {}
+    courses = {}
+    if len(catalog.CLASSES) > 0:
+        for name, unit in store.load_units(text=True).items():
+            if hasattr(unit, "text"):
+                units[name] = page(unit.text)
+        for name in store.course_names():
+            course = store.get_course(name, load_units=False)
+            if getattr(course, "url", None) and len(course.text) > 0:
+                courses[urlsplit(course.url).path.lower()] = page([course.text])
+    if fixtures is not None and pathlib.Path(fixtures).exists():
+        for f in sorted(pathlib.Path(fixtures).glob("*.html")):
+            units[f.stem] = f.read_text(encoding="utf-8")
+    if cache is not None:
+        for name in list(units):
+            cached = cache.lookup(UNIT_URL + name)
+            if cached is not None:
+                units[name] = cached[1]
+    return units, courses
+
+
+class StandIn(ThreadingHTTPServer):
+    """the server, with the pages and what to inject"""
+    daemon_threads = True
+
+    def __init__(self, address, units, courses, latency=0.0, jitter=0.0, rate=None,
+                 errors=0.0, seed=0) -> None:
+        super().__init__(address, Handler)
+        self.units = units
+        self.courses = courses
+        self.latency = latency
+        self.jitter = jitter
+        self.rate = rate
+        self.errors = errors
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = []        # times of the requests answered in the last second
+        self.counts = {"requests": 0, "200": 0, "404": 0, "429": 0, "500": 0, "bytes": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+    def decide(self):
+        """ what to do with the next request: returns (status or None, delay).
+            None means serve the page.
+        """
+        with self.lock:
+            self.counts["requests"] += 1
+            now = time.monotonic()
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            if self.rate:
+                self.window = [t for t in self.window if now - t < 1.0]
+                if len(self.window) >= self.rate:
+                    return 429, delay
+                self.window.append(now)
+            if self.errors and self.random.random() < self.errors:
+                return 500, delay
+            return None, delay
+
+    def count(self, status, size) -> None:
+        with self.lock:
+            self.counts[str(status)] = self.counts.get(str(status), 0) + 1
+            self.counts["bytes"] += size
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, like the real server
+
+    def do_GET(self):
+        self.answer(True)
+
+    def do_HEAD(self):
+        self.answer(False)
+
+    def answer(self, body):
+        server = self.server
+        url = urlsplit(self.path)
+        if url.path == "/_stats":
+            self.reply(200, json.dumps(server.stats()), body, "application/json", count=False)
+            return
+        status, delay = server.decide()
+        if delay > 0:
+            time.sleep(delay)
+        if status == 429:
+            self.reply(429, "too many requests", body, headers={"Retry-After": "1"})
+        elif status is not None:
+            self.reply(status, "server error", body)
+        elif url.path == "/unitdetails":
+            code = parse_qs(url.query).get("code", [""])[0]
+            if code in server.units:
+                self.reply(200, server.units[code], body)
+            else:
+                self.reply(404, "not found", body)
+        elif url.path.lower() in server.courses:
+            self.reply(200, server.courses[url.path.lower()], body)
+        else:
+            self.reply(404, "not found", body)
+
+    def reply(self, status, text, body=True, content_type="text/html; charset=utf-8",
+              headers=None, count=True):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+        if count:
+            self.server.count(status, len(data) if body else 0)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve(host="127.0.0.1", port=0, units=None, courses=None, **options):
+    """ runs a StandIn in a background thread for the with block.
+        port 0 picks a free port, see server.url. options are StandIn's
+        (latency, jitter, rate, errors, seed).
+    """
+    if units is None or courses is None:
+        recorded = recorded_pages(cache=handbook.cache)
+        units = recorded[0] if units is None else units
+        courses = recorded[1] if courses is None else courses
+    server = StandIn((host, port), units, courses, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="local stand-in for the UWA handbook")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds")
+    parser.add_argument("--rate", type=float, default=None, help="requests per second before 429s")
+    parser.add_argument("--errors", type=float, default=0.0, help="fraction of requests that get a 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    units, courses = recorded_pages(cache=handbook.cache)
+    server = StandIn((args.host, args.port), units, courses, args.latency, args.jitter,
+                     args.rate, args.errors, args.seed)
+    print(f"serving {len(units)} units and {len(courses)} courses on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
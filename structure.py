@@ -0,0 +1,188 @@
+"""
+    reads the course structure (core, option, bridging and conversion units of
+    every level) out of the text of a course page, in one pass.
+    the part of the page with the structure is cut out as the first matching
+    entry of LAYOUTS says, split at its markers ("Level", "Option", "Bridging",
+    "Conversion") and every unit code and "N points" in between becomes an Event
+        Event(section, level, kind, group, points, code)
+    section     which piece of the layout it came from
+    level       the level it's in (0 for conversion units before level 1)
+    kind        "level", "core", "option", "bridging" or "conversion"
+    group       the option group within the level (0 for the other kinds)
+    points      the last "N points" seen in the group, None if there wasn't one
+    code        the unit code, None for a points or an opening event
+    an opening event (points and code both None) starts a new, empty list.
+    collect() turns the events into (conversion, bridging, core, option) the
+    way Course keeps them:
+        conversion, bridging, core, option = parse(course.text)
+"""
+
+import bisect
+import re
+from collections import namedtuple
+
+Event = namedtuple("Event", "section level kind group points code")
+
+# how the structure is cut out of a course page, the first layout whose marker is
+# on the page and whose start is in the cut out text is used ("" is on every page).
+#   pieces      (from, to, replacements): the text from "from" up to "to" (None for
+#               the start or end of the page), with the replacements made in it.
+#               the pieces are joined with a space
+#   start       the structure starts at the first of these in the pieces
+#   chunk       the marker that starts a new level
+LAYOUTS = (
+    {"marker": "Master of Professional Engineering",
+     "pieces": (("Course structure details", "Biomedical Engineering specialisation", ()),
+                ("Software Engineering specialisation", "Meet our students",
+                 (("Take unit(s) to the value of 36 points",
+                   "Option - Take unit(s) to the value of 36 points"),))),
+     "start": "Level 1", "chunk": "Level"},
+    {"marker": "Software Engineering major units.",
+     "pieces": (("Software Engineering major units.", "Course structure details Your degree options", ()),),
+     "start": "Level 1", "chunk": "Level"},
+    {"marker": "Accreditation",
+     "pieces": (("Course structure details", "Accreditation", ()),),
+     "start": "Level 1", "chunk": "Level"},
+    {"marker": "Course accreditation",
+     "pieces": (("Course structure details", "Course accreditation", ()),),
+     "start": "Level 1", "chunk": "Level"},
+    # no levels (e.g. Master of Information Technology): conversion units, then
+    # each "Core" starts the next level
+    {"marker": "Conversion",
+     "pieces": (("Course structure details", None, ()),),
+     "start": "Conversion", "chunk": "Core"},
+    {"marker": "",
+     "pieces": ((None, None, ()),),
+     "start": "Level 1", "chunk": "Level"},
+)
+CLEAN = (("Honours", ""),)      # replacements made in the structure before it's read
+TOKEN = re.compile(r"\b[a-zA-Z]{4}\d{4}\b|\b(?:6|12|24|36|48) points\b")
+_splitters = {}
+
+
+def cut(text):
+    """ returns (layout, structure text, offset of every piece in it), or
+        (None, "", []) if no layout fits the page.
+    """
+    for layout in LAYOUTS:
+        if layout["marker"] not in text:
+            continue
+        pieces = []
+        for start, end, replacements in layout["pieces"]:
+            i = 0 if start is None else text.find(start)
+            j = len(text) if end is None else text.find(end, max(i, 0))
+            if i < 0 or j < 0:
+                break
+            piece = text[i:j]
+            for old, new in replacements + CLEAN:
+                piece = piece.replace(old, new)
+            pieces.append(piece)
+        else:
+            region = " ".join(pieces)
+            begin = region.find(layout["start"])
+            if begin < 0:
+                continue
+            offsets = []
+            for piece in pieces:
+                offsets.append(max(0, sum(len(p) + 1 for p in pieces[:len(offsets)]) - begin))
+            return layout, region[begin:], offsets
+    return None, "", []
+
+
+def splitter(chunk):
+    """the compiled pattern for the markers of a layout"""
+    if chunk not in _splitters:
+        markers = dict.fromkeys((chunk, "Option", "Bridging", "Conversion"))
+        _splitters[chunk] = re.compile("|".join(re.escape(marker) for marker in markers))
+    return _splitters[chunk]
+
+
+def segments(region, chunk):
+    """(the marker just before it, text, offset) for every stretch of text between markers"""
+    last, marker = 0, None
+    for match in splitter(chunk).finditer(region):
+        yield marker, region[last:match.start()], last
+        marker, last = match.group(), match.end()
+    yield marker, region[last:], last
+
+
+def events(text):
+    """the Events of the course structure on a course page, in page order"""
+    layout, region, offsets = cut(text)
+    if layout is None:
+        return
+
+    def tokens(part, level, kind, group):
+        section = bisect.bisect_right(offsets, part[0][2]) - 1 if len(part) > 0 else 0
+        yield Event(section, level, kind, group, None, None)
+        points = None
+        for _, stretch, offset in part:
+            section = bisect.bisect_right(offsets, offset) - 1
+            for match in TOKEN.finditer(stretch):
+                token = match.group()
+                if token.endswith("points"):
+                    points = token
+                    yield Event(section, level, kind, group, points, None)
+                else:
+                    yield Event(section, level, kind, group, points, token)
+
+    # a level is everything from one chunk marker to the next
+    levels = [[]]
+    for segment in segments(region, layout["chunk"]):
+        if segment[0] == layout["chunk"]:
+            levels.append([])
+        levels[-1].append(segment)
+    if not any(stretch.strip() for _, stretch, _ in levels[0]):
+        levels = levels[1:]
+
+    level = 0
+    for stretches in levels:
+        parts = [[]]
+        for segment in stretches:
+            if segment[0] == "Option":
+                parts.append([])
+            parts[-1].append(segment)
+        if any(marker == "Conversion" for marker, _, _ in stretches):
+            yield Event(0, level, "level", 0, None, None)
+            yield from tokens(parts[0], level, "conversion", 0)
+        else:
+            level = max(level, 1)
+            yield Event(0, level, "level", 0, None, None)
+            for i, part in enumerate(parts):
+                bridge = next((k for k, segment in enumerate(part) if segment[0] == "Bridging"), len(part))
+                if bridge < len(part):
+                    yield from tokens(part[bridge:], level, "bridging", 0)
+                if i == 0:
+                    yield from tokens(part[:bridge], level, "core", 0)
+                else:
+                    yield from tokens(part[:bridge], level, "option", i - 1)
+        level += 1
+
+
+def collect(events) -> tuple:
+    """ (conversion, bridging, core, option) from the events, each {level: list}.
+        core lists only have unit codes, the others the "N points" as well and
+        option has a list per group.
+    """
+    conversion, bridging, core, option = {}, {}, {}, {}
+    lists = {"conversion": conversion, "bridging": bridging, "core": core}
+    for event in events:
+        opening = event.code is None and event.points is None
+        if event.kind == "level":
+            option[event.level] = []
+        elif event.kind == "option":
+            groups = option[event.level]
+            if opening:
+                groups.append([])
+            else:
+                groups[event.group].append(event.code or event.points)
+        elif opening:
+            lists[event.kind][event.level] = []
+        elif event.code is not None or event.kind != "core":
+            lists[event.kind][event.level].append(event.code or event.points)
+    return conversion, bridging, core, option
+
+
+def parse(text) -> tuple:
+    """(conversion, bridging, core, option) of a course page's text"""
+    return collect(events(text))
@@ -0,0 +1,7 @@
+"""the modules are at the top of the repo, not in a package"""
+
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
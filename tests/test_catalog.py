@@ -0,0 +1,128 @@
+"""the catalog store (catalog.py): round trips, migrating the old pickles, appending and compacting"""
+
+import shutil
+
+import pytest
+
+from conftest import ROOT
+import catalog
+import prerequisite_checker     # registers the Unit, UnitList and Course classes
+
+UNITS = ["CITS1401", "CITS2200", "CITS2200 2024", "CITS1003b"]
+COURSE = "Data Science"
+
+
+@pytest.fixture
+def units():
+    return {name: catalog.load_pickle(ROOT / "units" / name) for name in UNITS}
+
+
+@pytest.fixture
+def store(tmp_path, units):
+    store = catalog.CatalogStore(tmp_path / "catalog.db")
+    with store.batch() as batch:
+        for name, unit in units.items():
+            batch.put_unit(unit, name)
+    return store
+
+
+def test_unit_round_trip(store, units):
+    again = catalog.CatalogStore(store.path)
+    assert again.unit_names() == sorted(UNITS)
+    for name, unit in units.items():
+        saved = again.get_unit(name)
+        assert saved.title == unit.title
+        assert saved.credit == unit.credit
+        assert saved.semester == unit.semester
+        assert saved.prereq == unit.prereq
+        assert saved.get_prereq_expr() == unit.get_prereq_expr()
+        assert not hasattr(saved, "text")
+        if hasattr(unit, "text"):
+            assert again.get_unit(name, text=True).text == unit.text
+
+
+def test_find_by_code_and_year(store):
+    assert store.find("CITS2200") == "CITS2200 2024"
+    assert store.find("CITS2200", 2023) == "CITS2200"
+    assert store.find("CITS1003") is None      # the hand made copy is only found as itself
+    assert store.find("CITS1003b") == "CITS1003b"
+
+
+def test_course_round_trip(store):
+    course = catalog.load_pickle(ROOT / "courses" / COURSE)
+    with store.batch() as batch:
+        batch.put_course(course, COURSE)
+    again = catalog.CatalogStore(store.path)
+    saved = again.get_course(COURSE)
+    assert saved.title == course.title
+    assert saved.core == course.core
+    # placeholders with no unit ("6 points": None) aren't kept
+    assert list(saved.unitlist.units) == [name for name, unit in course.unitlist.units.items()
+                                          if unit is not None]
+    assert all(again.get_unit(name) is not None for name in saved.unitlist.units)
+    lazy = again.get_course(COURSE, load_units=False)
+    assert lazy.core == course.core
+
+
+def test_delete(store):
+    store.delete_units(["CITS1401"])
+    assert "CITS1401" not in catalog.CatalogStore(store.path)
+    assert store.get_unit("CITS1401") is None
+
+
+def test_migrate(tmp_path):
+    unit_path, course_path = tmp_path / "units", tmp_path / "courses"
+    unit_path.mkdir()
+    course_path.mkdir()
+    for name in UNITS:
+        shutil.copy(ROOT / "units" / name, unit_path / name)
+    shutil.copy(ROOT / "courses" / COURSE, course_path / COURSE)
+    store = catalog.migrate(unit_path, course_path, tmp_path / "catalog.db")
+    course = store.get_course(COURSE)
+    assert course.title == COURSE
+    assert set(UNITS) | set(course.unitlist.units) == set(store.unit_names())
+    # the copies in units/ win over the ones saved in the course
+    assert store.get_unit("CITS2200").title == catalog.load_pickle(unit_path / "CITS2200").title
+
+
+def test_append_keeps_old_records(store, units):
+    size = store.path.stat().st_size
+    unit = units["CITS1401"]
+    unit.title = "Changed"
+    with store.batch() as batch:
+        batch.put_unit(unit, "CITS1401")
+    assert store.path.stat().st_size > size      # written on the end, the file isn't rewritten
+    again = catalog.CatalogStore(store.path)
+    assert again.get_unit("CITS1401").title == "Changed"
+    assert again.get_unit("CITS2200").title == units["CITS2200"].title
+
+
+def rewrite(store, unit, times):
+    for n in range(times):
+        unit.title = f"Title {n}"
+        with store.batch() as batch:
+            batch.put_unit(unit, unit.code)
+
+
+def check_compacted(store, unit):
+    again = catalog.CatalogStore(store.path)
+    assert again.unit_names() == sorted(UNITS)
+    assert again.get_unit("CITS2200").title == unit.title
+    assert again.get_unit("CITS2200", text=True).text == unit.text
+
+
+def test_compact(store, units, monkeypatch):
+    monkeypatch.setattr(catalog, "COMPACT", 100)
+    rewrite(store, units["CITS2200"], 10)
+    grown = store.path.stat().st_size
+    with store.batch() as batch:
+        batch.compact = True
+    assert store.path.stat().st_size < grown
+    check_compacted(store, units["CITS2200"])
+
+
+def test_compacts_by_itself(store, units):
+    live = store.path.stat().st_size
+    rewrite(store, units["CITS2200"], 20)
+    assert store.path.stat().st_size <= catalog.COMPACT * live
+    check_compacted(store, units["CITS2200"])
@@ -0,0 +1,94 @@
+"""prerequisite expressions (prereq.py): parsing, evaluating and the old prereqlist view"""
+
+from itertools import combinations
+
+import pytest
+
+import prereq
+
+AND_OF_ORS = ("and", ("or", "CITS1001", "CITS1401"), ("or", "MATH1721", "MATH1722"))
+
+
+@pytest.mark.parametrize("text, expr", [
+    # "or" binds tighter than "and", the way the handbook writes it
+    ("CITS1001 or CITS1401 and MATH1721 or MATH1722", AND_OF_ORS),
+    # brackets are respected
+    ("(CITS1001 and CITS1401) or CITS2200", ("or", ("and", "CITS1001", "CITS1401"), "CITS2200")),
+    # anything that isn't a unit code is left out
+    ("Enrolment in the Bachelor of Science and CITS1001 Software Engineering with Java", "CITS1001"),
+    ("ATAR Mathematics Methods", None),
+    ("", None),
+    # codes listed next to each other are alternatives
+    ("CITS1001 CITS1401 and CITS2200", ("and", ("or", "CITS1001", "CITS1401"), "CITS2200")),
+    # repeats and absorption
+    ("CITS2200 and (CITS2200 or CITS1001)", "CITS2200"),
+])
+def test_from_text(text, expr):
+    assert prereq.from_text(text) == expr
+
+
+def test_parse_keeps_structure():
+    assert prereq.parse("CITS2200 and (CITS2200 or CITS1001)") == ("and", "CITS2200", ("or", "CITS2200", "CITS1001"))
+
+
+@pytest.mark.parametrize("completed, result", [
+    (set(), False),
+    ({"CITS1001"}, False),
+    ({"CITS1001", "MATH1722"}, True),
+    ({"CITS1401", "MATH1721", "CITS2200"}, True),
+    ({"MATH1721", "MATH1722"}, False),
+])
+def test_evaluate(completed, result):
+    assert prereq.evaluate(AND_OF_ORS, completed) is result
+
+
+def test_evaluate_nothing_needed():
+    assert prereq.evaluate(None, set()) is True
+
+
+def test_remaining():
+    assert prereq.remaining(AND_OF_ORS, {"CITS1001"}) == ("or", "MATH1721", "MATH1722")
+    assert prereq.remaining(AND_OF_ORS, {"CITS1001", "MATH1721"}) is None
+
+
+def test_to_dnf():
+    assert prereq.to_dnf(AND_OF_ORS) == [["CITS1001", "MATH1721"], ["CITS1001", "MATH1722"],
+                                         ["CITS1401", "MATH1721"], ["CITS1401", "MATH1722"]]
+    assert prereq.to_dnf("CITS1001") == [["CITS1001"]]
+    assert prereq.to_dnf(None) == []
+    # repeated alternatives come out once
+    assert prereq.to_dnf(("or", "CITS1001", ("and", "CITS1001", "CITS1001"))) == [["CITS1001"]]
+
+
+def subsets(codes):
+    codes = sorted(codes)
+    for n in range(len(codes) + 1):
+        yield from (set(completed) for completed in combinations(codes, n))
+
+
+def test_dnf_round_trip():
+    expr = prereq.from_text("(CITS1001 and CITS1401) or CITS2200 and MATH1721 or MATH1722")
+    again = prereq.from_dnf(prereq.to_dnf(expr))
+    for completed in subsets(prereq.codes(expr)):
+        assert prereq.evaluate(again, completed) == prereq.evaluate(expr, completed)
+
+
+@pytest.mark.parametrize("text", [
+    "CITS1001 or CITS1401 and MATH1721 or MATH1722",
+    "(CITS1001 and CITS1401) or CITS2200",
+    "CITS2200 and (CITS1001 or (CITS1401 and MATH1721))",
+    "CITS1001",
+    "",
+])
+def test_bits_agree_with_evaluate(text):
+    expr = prereq.from_text(text)
+    table = prereq.CodeTable()
+    compiled = prereq.BitPrereq(expr, table)
+    for completed in subsets(prereq.codes(expr) | {"CITS9999"}):
+        assert compiled.check(table.mask(completed)) == prereq.evaluate(expr, completed)
+
+
+def test_code_table_decode():
+    table = prereq.CodeTable(["CITS1001", "CITS1401", "CITS2200"])
+    assert table.decode(table.mask(["CITS2200", "CITS1001"])) == ["CITS1001", "CITS2200"]
+    assert table.decode(0) == []
@@ -0,0 +1,165 @@
+"""the semester scheduler (scheduler.py): plans that fit, ones that can't and relaxed ones"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import prereq
+import scheduler
+from scheduler import PlanError
+
+
+class FakeUnit:
+    """the parts of a Unit the scheduler looks at"""
+    def __init__(self, code, semester=(1, 2), prereq_text="", credit=6) -> None:
+        self.code = code
+        self.semester = set(semester)
+        self.credit = credit
+        self.expr = prereq.from_text(prereq_text)
+
+    def get_prereq_expr(self):
+        return self.expr
+
+
+def course(units, levels, option=None):
+    """a course with units as its core at their levels (see scheduler.course_units)"""
+    core = {}
+    for name, level in levels.items():
+        core.setdefault(level, []).append(name)
+    return SimpleNamespace(core=core, option={} if option is None else option,
+                           unitlist=SimpleNamespace(units=units))
+
+
+def check_plan(plan, units, levels):
+    """ every unit once, after its prerequisites (the ones in the course), in a
+        semester it runs, in the year of its level or later
+    """
+    outside = set().union(*(prereq.codes(unit.get_prereq_expr()) for unit in units.values())) - set(levels)
+    done = set(scheduler.ASSUMED) | outside
+    seen = []
+    for label, names in plan.semesters.items():
+        year, sem = int(label[1]), int(label[3])
+        assert sum(scheduler.places(units[name]) for name in names) <= scheduler.MAX_UNITS
+        for name in names:
+            assert sem in units[name].semester
+            assert prereq.evaluate(units[name].get_prereq_expr(), done)
+            if scheduler.EARLY not in plan.warnings:
+                assert year >= levels[name]
+        seen.extend(names)
+        done |= set(names)
+    assert sorted(seen) == sorted(levels)
+
+
+UNITS = {
+    "CITS1001": FakeUnit("CITS1001"),
+    "CITS1401": FakeUnit("CITS1401", (2,), "CITS1001"),
+    "CITS1402": FakeUnit("CITS1402", (1,)),
+    "CITS2200": FakeUnit("CITS2200", (1, 2), "CITS1401"),
+    "CITS2002": FakeUnit("CITS2002", (1,), "CITS1001 or CITS1401"),
+    "CITS2211": FakeUnit("CITS2211", (2,), "CITS2200 and CITS1402"),
+}
+LEVELS = {"CITS1001": 1, "CITS1401": 1, "CITS1402": 1, "CITS2200": 2, "CITS2002": 2, "CITS2211": 2}
+
+
+@pytest.mark.parametrize("intake", [1, 2])
+def test_feasible(intake):
+    plan = scheduler.Scheduler(UNITS, LEVELS, intake, years=3).solve()
+    assert list(plan.semesters)[0] == f"Y1S{intake}"
+    assert plan.warnings == []
+    check_plan(plan, UNITS, LEVELS)
+
+
+def test_same_plan_every_time():
+    first = scheduler.schedule(course(UNITS, LEVELS))
+    assert scheduler.schedule(course(UNITS, LEVELS)).semesters == first.semesters
+    check_plan(first, UNITS, LEVELS)
+
+
+def test_capacity():
+    units = {f"CITS10{n:02}": FakeUnit(f"CITS10{n:02}") for n in range(9)}
+    with pytest.raises(PlanError) as e:
+        scheduler.Scheduler(units, dict.fromkeys(units, 1)).solve()
+    assert e.value.constraint == "capacity"
+
+
+def test_two_place_unit():
+    units = {"CITS4010": FakeUnit("CITS4010", credit=12),
+             **{f"CITS40{n:02}": FakeUnit(f"CITS40{n:02}") for n in range(20, 26)}}
+    levels = dict.fromkeys(units, 1)
+    plan = scheduler.Scheduler(units, levels).solve()
+    check_plan(plan, units, levels)
+    units["CITS4026"] = FakeUnit("CITS4026")
+    with pytest.raises(PlanError) as e:
+        scheduler.Scheduler(units, dict.fromkeys(units, 1)).solve()
+    assert e.value.constraint == "capacity"
+
+
+def test_no_order_fits():
+    # CITS1001 runs in semester 2 only, CITS1401 needs it and runs in semester 1 only
+    units = {"CITS1001": FakeUnit("CITS1001", (2,)),
+             "CITS1401": FakeUnit("CITS1401", (1,), "CITS1001")}
+    with pytest.raises(PlanError) as e:
+        scheduler.Scheduler(units, dict.fromkeys(units, 1)).solve()
+    assert e.value.constraint == "schedule"
+    plan = scheduler.Scheduler(units, dict.fromkeys(units, 1), years=2).solve()
+    assert plan.semesters == {"Y1S1": [], "Y1S2": ["CITS1001"], "Y2S1": ["CITS1401"], "Y2S2": []}
+
+
+def test_prerequisite_outside_the_course():
+    units = {**UNITS, "CITS3001": FakeUnit("CITS3001", prereq_text="CITS2200 and PHYS1001")}
+    levels = {**LEVELS, "CITS3001": 3}
+    with pytest.raises(PlanError) as e:
+        scheduler.Scheduler(units, levels, strict=True)
+    assert e.value.constraint == "prerequisite"
+    plan = scheduler.Scheduler(units, levels, strict=False).solve()
+    assert any(warning.startswith("CITS3001: prerequisites outside the course") for warning in plan.warnings)
+    check_plan(plan, units, levels)
+
+
+def test_not_offered():
+    units = {**UNITS, "CITS1003": FakeUnit("CITS1003", ())}
+    levels = {**LEVELS, "CITS1003": 1}
+    with pytest.raises(PlanError) as e:
+        scheduler.Scheduler(units, levels, strict=True)
+    assert e.value.constraint == "offering"
+    plan = scheduler.Scheduler(units, levels, strict=False).solve()
+    assert any(warning.startswith("CITS1003: not offered") for warning in plan.warnings)
+
+
+def test_relaxed_takes_units_early():
+    # nine level 2 units don't fit in year 2, two of them have to go in year 1
+    units = {f"CITS20{n:02}": FakeUnit(f"CITS20{n:02}") for n in range(9)}
+    levels = dict.fromkeys(units, 2)
+    with pytest.raises(PlanError) as e:
+        scheduler.schedule(course(units, levels), strict=True)
+    assert e.value.constraint == "schedule"
+    plan = scheduler.schedule(course(units, levels), strict=False)
+    assert scheduler.EARLY in plan.warnings
+    check_plan(plan, units, levels)
+    early = sum(len(names) for label, names in plan.semesters.items() if label.startswith("Y1"))
+    assert 0 < early <= scheduler.MAX_EARLY
+
+
+def test_count_iter_and_best_agree():
+    names = ("CITS1001", "CITS1401", "CITS1402", "CITS2200", "CITS2002", "CITS2211")
+    units = {name: UNITS[name] for name in names}
+    levels = {name: LEVELS[name] for name in names[:4]}
+    option = {2: [["6 points", "CITS2002", "CITS2211"]]}
+    found = [plan.semesters for plan in scheduler.iter_plans(course(units, levels, option))]
+    assert len(found) == scheduler.count_plans(course(units, levels, option)) > 0
+    assert len({str(semesters) for semesters in found}) == len(found)
+    best = scheduler.best_plans(course(units, levels, option), k=3)
+    assert len(best) == 3
+    assert [score for score, _ in best] == sorted(score for score, _ in best)
+    assert all(plan.semesters in found for _, plan in best)
+
+
+def test_relaxed_plans_are_streamed_too():
+    units = {f"CITS20{n:02}": FakeUnit(f"CITS20{n:02}") for n in range(9)}
+    levels = dict.fromkeys(units, 2)
+    assert scheduler.count_plans(course(units, levels), strict=True) == 0
+    plans = list(scheduler.iter_plans(course(units, levels)))
+    assert len(plans) == scheduler.count_plans(course(units, levels)) > 0
+    for plan in plans:
+        assert scheduler.EARLY in plan.warnings
+        check_plan(plan, units, levels)
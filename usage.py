@@ -0,0 +1,185 @@
+"""
+    where every unit is used: the courses that have it as core, option, bridging
+    or conversion unit, and the units that list it as a prerequisite, so "what's
+    hit if CITS2200 changes" is a lookup instead of going through every course
+    and every unit.
+
+        uses = open_index(STORE)
+        uses.courses("CITS2200")        # [Use(course, level, kind, group, points), ...]
+        uses.dependents("CITS2200")     # names of units that list it as a prerequisite
+        uses.impact("CITS2200")         # both
+        UNIT_HOOKS.append(uses.update_unit)       # kept up to date as units are saved,
+        COURSE_HOOKS.append(uses.update_course)   # and courses saved or edited,
+        SAVE_HOOKS.append(uses.save)              # and written once a save is done
+
+    kind is "core", "option", "bridging" or "conversion", group the option group
+    (None for the rest) and points the "N points" the group is taken to (None if
+    it doesn't say).
+    the index is saved next to the catalog (USAGE_PATH) with the catalog's generation,
+    and made again from the catalog when the catalog changed since. the hooks only
+    change it in memory, it's written by save (SAVE_HOOKS), once for a whole batch
+    of saved units. a course edited but not saved yet (add_unitlist,
+    remove_unitlist) is only changed in memory and never written, the saved index
+    always matches what's in the catalog.
+    units are looked up by code (the name without the year, see catalog.unit_key),
+    so a hand made copy like "CITS1003b" is its own code.
+"""
+
+import pathlib
+import pickle
+from collections import namedtuple
+
+import catalog
+import prereq
+
+USAGE_PATH = "./catalog.uses"
+KINDS = ("conversion", "bridging", "core")      # plain lists of codes, option has groups
+
+Use = namedtuple("Use", "course level kind group points")
+
+
+def code_of(name) -> str:
+    """the code a unit name is indexed under"""
+    return catalog.unit_key(name, None)[0]
+
+
+def group_uses(course, level, kind, group, codes):
+    """(code, Use) for the codes of one list of the course structure"""
+    points = None
+    for code in codes:
+        if code.endswith("points"):
+            points = code
+        else:
+            yield code_of(code), Use(course, level, kind, group, points)
+
+
+def course_uses(name, course):
+    """(code, Use) for every unit in the course structure of course"""
+    for kind in KINDS:
+        for level, codes in getattr(course, kind, {}).items():
+            yield from group_uses(name, level, kind, None, codes)
+    for level, groups in getattr(course, "option", {}).items():
+        for group, codes in enumerate(groups):
+            yield from group_uses(name, level, "option", group, codes)
+
+
+class UsageIndex:
+    def __init__(self, path=USAGE_PATH, store=None) -> None:
+        self.path = None if path is None else pathlib.Path(path)
+        self.store = store
+        self.uses = {}          # code -> set of Use
+        self.used = {}          # course name -> set of codes in it (to undo an update)
+        self.required_by = {}   # code -> set of unit names that list it
+        self.requires = {}      # unit name -> set of codes it lists
+        self.drafts = {}        # course name -> {code: set of Use} of unsaved edits, never saved
+
+    def build(self, units, courses) -> None:
+        """ the whole index from {name: Unit} and {name: Course} (units only need
+            their prerequisites, courses their structure)
+        """
+        for name, unit in units.items():
+            self.set_unit(name, unit)
+        for name, course in courses.items():
+            self.set_course(name, course)
+
+    def set_unit(self, name, unit) -> None:
+        for code in self.requires.pop(name, ()):
+            self.required_by[code].discard(name)
+        if unit is not None:
+            codes = {code_of(code) for code in prereq.codes(unit.get_prereq_expr())} - {code_of(name)}
+            self.requires[name] = codes
+            for code in codes:
+                self.required_by.setdefault(code, set()).add(name)
+
+    def set_course(self, name, course) -> None:
+        for code in self.used.pop(name, ()):
+            self.uses[code] = {use for use in self.uses[code] if use.course != name}
+        if course is not None:
+            codes = set()
+            for code, use in course_uses(name, course):
+                self.uses.setdefault(code, set()).add(use)
+                codes.add(code)
+            self.used[name] = codes
+
+    def update_unit(self, name, unit) -> None:
+        """a unit was saved (or deleted if unit is None), for UNIT_HOOKS"""
+        self.set_unit(name, unit)
+
+    def update_course(self, name, course, saved=True) -> None:
+        """ a course was saved (or deleted if course is None), or its units changed
+            without saving it if not saved, for COURSE_HOOKS. unsaved changes are
+            only kept apart in memory until the course is saved.
+        """
+        if not saved:
+            draft = self.drafts[name] = {}
+            for code, use in course_uses(name, course):
+                draft.setdefault(code, set()).add(use)
+            return
+        self.drafts.pop(name, None)
+        self.set_course(name, course)
+
+    def courses(self, code) -> list:
+        """every Use of code in a course (with unsaved edits to courses)"""
+        code = code_of(code)
+        uses = {use for use in self.uses.get(code, ()) if use.course not in self.drafts}
+        for draft in self.drafts.values():
+            uses |= draft.get(code, set())
+        return sorted(uses, key=lambda use: (use.course, use.level, use.kind,
+                                             -1 if use.group is None else use.group))
+
+    def dependents(self, code) -> list:
+        """names of the units that list code as a prerequisite"""
+        return sorted(self.required_by.get(code_of(code), ()))
+
+    def impact(self, code) -> dict:
+        """{"courses": courses(code), "dependents": dependents(code)}"""
+        return {"courses": self.courses(code), "dependents": self.dependents(code)}
+
+    def save(self) -> None:
+        """ writes the index to its path, stamped with the catalog it matches, for
+            SAVE_HOOKS (unsaved course edits aren't written)
+        """
+        if self.path is None:
+            return
+        source = None
+        if self.store is not None:
+            self.store.refresh()
+            source = self.store.index["generation"]
+        state = {"source": source, "uses": self.uses, "used": self.used,
+                 "required_by": self.required_by, "requires": self.requires}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        tmp.replace(self.path)
+
+    def load(self):
+        """ the saved index as of the catalog's generation, None if there isn't one (or it's
+            from another version of the catalog)
+        """
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        self.store.refresh()
+        if state.get("source") != self.store.index["generation"]:
+            return None
+        self.uses, self.used = state["uses"], state["used"]
+        self.required_by, self.requires = state["required_by"], state["requires"]
+        return self
+
+
+def open_index(store=None, path=USAGE_PATH) -> UsageIndex:
+    """ the index of store (default the catalog at CATALOG_PATH) saved at path, made
+        again from the catalog first if it's missing or older than the catalog
+    """
+    store = catalog.CatalogStore() if store is None else store
+    index = UsageIndex(path, store)
+    if path is not None and index.load() is not None:
+        return index
+    if len(catalog.CLASSES) == 0:
+        import prerequisite_checker     # registers the classes catalog records are loaded as
+    courses = {name: store.get_course(name, load_units=False) for name in store.course_names()}
+    index.build(store.load_units(), courses)
+    index.save()
+    return index